@@ -1,25 +1,63 @@
 import random
+import numpy as np
 
 from typing import Set
 from base.tree import TreeSymbol
 
 bottom_symbol = '⊥'
 
+INTERNAL, PUSH, POP = 0, 1, 2
+
+
 class VPAlphabet:
     """
     A class representing the Visible Pushdown Alphabet.
     The alphabet consists of push, pop, and internal symbols.
+
+    The alphabet is frozen once built, so everything derived from it is computed
+    only once: the symbol sets, the kind of every symbol, a dense index of the
+    symbols and a NumPy table from character code to symbol index, used to encode
+    whole batches of sequences at once.
     """
 
     def __init__(self, push_symbols: Set, pop_symbols: Set, 
                  int_symbols: Set, name='VPAlphabet'):
-        self.push_symbols = push_symbols
-        self.pop_symbols = pop_symbols
-        self.int_symbols = int_symbols
-        self.name = name
+        init = lambda attribute, value: object.__setattr__(self, attribute, value)
+        init('push_symbols', frozenset(push_symbols))
+        init('pop_symbols', frozenset(pop_symbols))
+        init('int_symbols', frozenset(int_symbols))
+        init('name', name)
+        init('all_symbols', self.push_symbols | self.pop_symbols | self.int_symbols)
+
+        # Símbolos ordenados por tipo y nombre: el índice denso de cada símbolo.
+        symbols = tuple(sorted(self.int_symbols)) + tuple(sorted(self.push_symbols)) + tuple(sorted(self.pop_symbols))
+        kinds = {symbol: INTERNAL for symbol in self.int_symbols}
+        kinds.update({symbol: PUSH for symbol in self.push_symbols})
+        kinds.update({symbol: POP for symbol in self.pop_symbols})
+        init('symbols', symbols)
+        init('kinds', kinds)
+        init('symbol_index', {symbol: i for i, symbol in enumerate(symbols)})
+        init('symbol_kinds', np.array([kinds[symbol] for symbol in symbols], dtype=np.int8))
+
+        # Character code -> symbol index (-1 for the characters outside the alphabet).
+        codes = [ord(symbol) for symbol in symbols if len(symbol) == 1]
+        code_table = np.full(max(codes, default=0) + 1, -1, dtype=np.int32)
+        for symbol, index in self.symbol_index.items():
+            if len(symbol) == 1:
+                code_table[ord(symbol)] = index
+        init('code_table', code_table)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("VPAlphabet is immutable.")
+
+    def __delattr__(self, name):
+        raise AttributeError("VPAlphabet is immutable.")
+
+    def __reduce__(self):
+        return (VPAlphabet, (self.push_symbols, self.pop_symbols, self.int_symbols, self.name))
     
     def get_all_symbols(self) -> Set:
-        return self.push_symbols.union(self.pop_symbols).union(self.int_symbols)
+        return self.all_symbols
     
     def get_push_symbols(self) -> Set:
         return self.push_symbols
@@ -29,20 +67,39 @@ class VPAlphabet:
     
     def get_int_symbols(self) -> Set:
         return self.int_symbols
+
+    def encode(self, sequence: str) -> np.ndarray:
+        """
+        Returns the symbol indices of a sequence of single-character symbols, -1 for unknown characters.
+        """
+        codes = np.frombuffer(sequence.encode('utf-32-le'), dtype=np.uint32)
+        known = codes < len(self.code_table)
+        return np.where(known, self.code_table[np.where(known, codes, 0)], -1)
+
+    def encode_batch(self, sequences: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Encodes many sequences at once. Returns the concatenated symbol indices and the
+        offsets of every sequence in them: sequence i is codes[offsets[i]:offsets[i + 1]].
+        """
+        offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+        np.cumsum([len(sequence) for sequence in sequences], out=offsets[1:])
+        return self.encode(''.join(sequences)), offsets
     
     def get_random_word(self, len: int = None) -> str:
         if len is None:
             len = random.randint(1, 50)
         if len < 1:
             raise ValueError("Length must be greater than 0.")
-        
-        return ''.join(random.choice(list(self.get_all_symbols())) for _ in range(len))
+
+        # All the symbols are drawn in a single call, seeded from `random` to keep runs reproducible.
+        rng = np.random.default_rng(random.getrandbits(64))
+        return ''.join(map(self.symbols.__getitem__, rng.integers(self.symbol_kinds.size, size=len).tolist()))
     
     def __str__(self):
         """
         String representation of the alphabet.
         """
-        return f"VPAlphabet({self.name}): Push: {self.push_symbols}, Pop: {self.pop_symbols}, Int: {self.int_symbols}"
+        return f"VPAlphabet({self.name}): Push: {set(self.push_symbols)}, Pop: {set(self.pop_symbols)}, Int: {set(self.int_symbols)}"
     
 class StackAlphabet:
     def __init__(self, symbols: Set, name='StackAlphabet'):
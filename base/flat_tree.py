@@ -0,0 +1,142 @@
+import numpy as np
+from base.tree import Tree, TreeSymbol
+
+
+class FlatTreeBatch:
+    """
+    A batch of trees flattened into node arrays.
+
+    Every node of the batch is a row with the index of its symbol in `symbols`
+    and the indices of its children in `children` (padded with -1). Nodes are
+    sorted by height, so the nodes of height h are the rows between
+    `level_offsets[h]` and `level_offsets[h + 1]`, and all the children of a
+    node always belong to a previous level. `roots` holds the root node of
+    every tree of the batch.
+    """
+
+    def __init__(self, symbols: list[TreeSymbol], node_symbols: np.ndarray,
+                 children: np.ndarray, roots: np.ndarray, level_offsets: np.ndarray):
+        self.symbols = symbols
+        self.node_symbols = node_symbols
+        self.children = children
+        self.roots = roots
+        self.level_offsets = level_offsets
+
+    @classmethod
+    def from_arrays(cls, symbols: list[TreeSymbol], node_symbols: np.ndarray,
+                    children: np.ndarray, roots: np.ndarray, heights: np.ndarray = None) -> 'FlatTreeBatch':
+        """
+        Builds a batch from node arrays in any order, sorting the nodes by height.
+        The heights are computed unless the caller already knows them.
+        """
+        node_symbols = np.asarray(node_symbols, dtype=np.int32)
+        children = np.asarray(children, dtype=np.int32)
+        roots = np.asarray(roots, dtype=np.int32)
+
+        if heights is not None:
+            heights = np.asarray(heights, dtype=np.int32)
+        else:
+            heights = np.zeros(len(node_symbols), dtype=np.int32)
+            if children.shape[1] > 0:
+                has_child = children >= 0
+                safe_children = np.where(has_child, children, 0)
+                while True:
+                    child_heights = np.where(has_child, heights[safe_children], -1)
+                    new_heights = child_heights.max(axis=1) + 1
+                    if np.array_equal(new_heights, heights):
+                        break
+                    heights = new_heights
+
+        order = np.argsort(heights, kind='stable')
+        position = np.empty_like(order)
+        position[order] = np.arange(len(order), dtype=order.dtype)
+
+        sorted_children = children[order]
+        sorted_children = np.where(sorted_children >= 0, position[np.maximum(sorted_children, 0)], -1)
+        level_offsets = np.searchsorted(heights[order], np.arange(heights.max(initial=0) + 2))
+
+        return cls(
+            symbols=symbols,
+            node_symbols=node_symbols[order],
+            children=sorted_children.astype(np.int32),
+            roots=position[roots].astype(np.int32),
+            level_offsets=level_offsets,
+        )
+
+    def __len__(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.node_symbols)
+
+    @property
+    def n_levels(self) -> int:
+        return len(self.level_offsets) - 1
+
+    def level(self, height: int) -> slice:
+        """
+        Returns the slice of the nodes with the given height.
+        """
+        return slice(self.level_offsets[height], self.level_offsets[height + 1])
+
+    def get_tree(self, index: int) -> Tree:
+        """
+        Rebuilds the index-th tree of the batch.
+        """
+        built = {}
+        pending = [self.roots[index]]
+        while pending:
+            node = pending[-1]
+            children = [child for child in self.children[node] if child >= 0]
+            missing = [child for child in children if child not in built]
+            if missing:
+                pending.extend(missing)
+                continue
+            pending.pop()
+            built[node] = Tree(self.symbols[self.node_symbols[node]], [built[child] for child in children])
+        return built[self.roots[index]]
+
+    def get_trees(self) -> list[Tree]:
+        return [self.get_tree(index) for index in range(len(self))]
+
+
+def flatten_trees(trees: list[Tree]) -> FlatTreeBatch:
+    """
+    Flattens a list of trees into a FlatTreeBatch.
+    Subtrees that are shared (the same object) are stored only once.
+    """
+    # Pre-order listing of the distinct nodes; reversed, every child comes before its parent.
+    seen = set()
+    order = []
+    for tree in trees:
+        pending = [tree]
+        while pending:
+            current = pending.pop()
+            if id(current) in seen:
+                continue
+            seen.add(id(current))
+            order.append(current)
+            pending.extend(current.children)
+    order.reverse()
+
+    symbols = []
+    symbol_ids = {}
+    node_ids = {id(node): i for i, node in enumerate(order)}
+    node_symbols = []
+    max_arity = max((len(node.children) for node in order), default=0)
+    children_columns = [[-1] * len(order) for _ in range(max_arity)]
+
+    for i, node in enumerate(order):
+        # Symbols are looked up by identity, hashing a TreeSymbol is comparatively slow.
+        symbol_id = symbol_ids.get(id(node.root))
+        if symbol_id is None:
+            symbol_id = symbol_ids[id(node.root)] = len(symbols)
+            symbols.append(node.root)
+        node_symbols.append(symbol_id)
+        for position, child in enumerate(node.children):
+            children_columns[position][i] = node_ids[id(child)]
+
+    children = np.array(children_columns, dtype=np.int32).T.reshape(len(order), max_arity)
+    roots = [node_ids[id(tree)] for tree in trees]
+    return FlatTreeBatch.from_arrays(symbols, node_symbols, children, roots)
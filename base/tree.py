@@ -1,5 +1,5 @@
-from typing import List
-from collections import deque
+import weakref
+from typing import Sequence
 
 class TreeSymbol:
     """
@@ -40,42 +40,85 @@ class Tree:
     """
     A tree structure with a root symbol and children.
     Each node in the tree is represented by a TreeSymbol.
+
+    Trees are immutable and hash-consed: building a tree that is structurally
+    equal to a live one returns the existing object. So equality is an identity
+    check and the hash is computed only once, when the node is built.
     """
-    def __init__(self, root: TreeSymbol, children: List['Tree'] = []):
-        self.root = root
+    __slots__ = ('root', 'children', '_hash', '_memo', '__weakref__')
+
+    _interned: 'weakref.WeakValueDictionary[tuple, Tree]' = weakref.WeakValueDictionary()
+
+    def __new__(cls, root: TreeSymbol, children: Sequence['Tree'] = ()):
+        children = tuple(children)
+        key = (root, children)
+        tree = cls._interned.get(key)
+        if tree is not None:
+            return tree
+
         assert root.arity == len(children), f"Arity of root {root} does not match number of children {len(children)}"
-        self.children = children
+        tree = super().__new__(cls)
+        object.__setattr__(tree, 'root', root)
+        object.__setattr__(tree, 'children', children)
+        object.__setattr__(tree, '_hash', hash(key))
+        object.__setattr__(tree, '_memo', None)
+        cls._interned[key] = tree
+        return tree
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Tree is immutable.")
+
+    def __delattr__(self, name):
+        raise AttributeError("Tree is immutable.")
+
+    def __reduce__(self):
+        """
+        Unpickled trees are interned again.
+        """
+        return (Tree, (self.root, self.children))
 
     def apply_context(self, context):
         """
         Apply a context to the tree.
-        The context must have exactly one context symbol.
+        The tree is placed in the hole of the context. Only the spine of the context,
+        from its root to the hole, is rebuilt; every other subtree is shared.
         """
-        if not context.has_exactly_one_context_symbol(context.root):
-            print(context)
-            raise ValueError("Tree must have exactly one context symbol.")
-        
-        return self._apply_recursive(context.root)
+        result = self
+        for symbol, left_siblings, right_siblings in context.spine:
+            result = Tree(symbol, left_siblings + (result,) + right_siblings)
+        return result
     
-    def _apply_recursive(self, tree):
+    def memo(self, owner):
         """
-        Recursively apply the context to the tree.
-        This method traverses the tree and applies the context symbol to each node.
+        Returns the value memoized on this tree by `owner`, or None.
         """
-        if tree.get_root_symbol() == context_symbol:
-            return self
-        
-        new_children = []
-        for child in tree.children:
-            new_children.append(self._apply_recursive(child))
-        
-        return Tree(tree.get_root_symbol(), new_children)
-    
+        memo = self._memo
+        return memo[1] if memo is not None and memo[0] is owner else None
+
+    def set_memo(self, owner, value):
+        """
+        Memoizes a value derived from this (immutable) tree. There is a single slot,
+        so a value memoized by another owner is replaced.
+        """
+        object.__setattr__(self, '_memo', (owner, value))
+
     def is_leaf(self):
         """
         Check if the tree is a leaf node (i.e., has no children).
         """
         return self.root.arity == 0
+
+    def size(self) -> int:
+        """
+        Number of nodes of the tree.
+        """
+        pending = [self]
+        count = 0
+        while pending:
+            current = pending.pop()
+            count += 1
+            pending.extend(current.children)
+        return count
     
     def __str__(self):
         """
@@ -86,15 +129,16 @@ class Tree:
     def __eq__(self, other):
         """
         Check if two trees are equal.
-        Two trees are equal if they have the same root symbol and the same children.
+        Two trees are equal if they have the same root symbol and the same children,
+        since trees are interned that only happens when they are the same object.
         """
-        return self.root == other.root and self.children == other.children
+        return self is other
     
     def __hash__(self):
         """
-        Hash function for the tree.
+        Hash function for the tree, cached when the tree is built.
         """
-        return hash((self.root, tuple(self.children)))
+        return self._hash
     
     def name(self):
         """
@@ -119,31 +163,47 @@ class Context:
     The context symbol is used to apply the context to the tree.
     """
 
-    def __init__(self, tree: Tree):
-        if self.has_exactly_one_context_symbol(tree):
-            self.root = tree
-        else:
+    def __init__(self, tree: Tree, hole_path: tuple[int, ...] = None):
+        if hole_path is None:
+            hole_path = self._find_hole_path(tree)
+        if hole_path is None:
             raise ValueError("Context must have exactly one context symbol.")
-    
-    def has_exactly_one_context_symbol(self, tree):
-        """
-        Check if the tree has exactly one context symbol.
-        """
-        queue = deque()
-        has_context_symbol = False
-        queue.append(tree)
-        while queue:
-            current_node = queue.popleft()
-            if current_node.is_leaf():
-                if current_node.root == context_symbol:
-                    if has_context_symbol:
-                        return False
-                    has_context_symbol = True
-            else:
-                children = current_node.children
-                for child in children:                    
-                    queue.append(child)
-        return has_context_symbol
+        self.root = tree
+        # Índices de los hijos que llevan de la raíz al agujero.
+        self.hole_path = hole_path
+
+        # The spine from the hole up to the root: for each node, its symbol and
+        # the siblings to the left and to the right of the path. A given hole path is
+        # checked on the way down: it has to end at the context symbol.
+        spine = []
+        node = tree
+        for index in hole_path:
+            if not 0 <= index < len(node.children):
+                raise ValueError(f"The hole path {hole_path} does not exist in {tree}.")
+            spine.append((node.root, node.children[:index], node.children[index + 1:]))
+            node = node.children[index]
+        if node.root != context_symbol:
+            raise ValueError(f"The hole path {hole_path} of {tree} does not lead to the context symbol.")
+        spine.reverse()
+        self.spine: tuple[tuple[TreeSymbol, tuple[Tree, ...], tuple[Tree, ...]], ...] = tuple(spine)
+
+    @staticmethod
+    def _find_hole_path(tree: Tree) -> tuple[int, ...] | None:
+        """
+        Returns the path to the context symbol, or None if the tree
+        does not have exactly one context symbol.
+        """
+        hole_path = None
+        pending = [(tree, ())]
+        while pending:
+            current_node, path = pending.pop()
+            if current_node.root == context_symbol:
+                if hole_path is not None:
+                    return None
+                hole_path = path
+            for index, child in enumerate(current_node.children):
+                pending.append((child, path + (index,)))
+        return hole_path
 
     def __str__(self):
         """
@@ -162,7 +222,7 @@ class Context:
         """
         Hash function for the context.
         """
-        return hash(self.root, tuple(self.root.children))
+        return hash(self.root)
     
     def get_children(self):
         """
@@ -11,6 +11,22 @@ class VPL(ABC):
     @abstractmethod
     def is_accepted(self, sequence: str) -> bool:
         raise NotImplementedError
+
+    def is_accepted_batch(self, sequences: list[str]) -> list[bool]:
+        """
+        Check the membership of many sequences at once.
+        Subclasses with a cheaper batched check (e.g. neural models) should override it.
+        """
+        return [self.is_accepted(sequence) for sequence in sequences]
+    
+    def identity(self) -> str:
+        """
+        Identifies the language in persistent query stores: two languages with the same
+        identity share their stored answers. It must cover everything the answers depend on
+        (parameters, model weights...), so there is no default and only languages that define
+        it can use a query store.
+        """
+        raise NotImplementedError(f"{type(self).__qualname__} does not define an identity.")
     
     def get_random_word(self) -> str:
         """
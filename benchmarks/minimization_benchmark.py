@@ -0,0 +1,65 @@
+import random
+import time
+from examples.dyck1 import Dyck1
+from models.vpg import vpg_from_tree_automata
+from tree_automata.tree_automata import TreeAutomata
+from tree_automata.tree_generator import TreeGenerator
+from tree_automata_extraction.tl_star import TLStar
+from utils.b_parse import get_t_b_parse
+from utils.encoding import vpalphabet_2_ranked
+from utils.well_formed import get_most_permissive_vpg_as_tree_automaton
+from vpl_extraction.vpl_star_oracle import VPLStarOracle
+from vpl_extraction.vpl_star_random_comparator import VPLRandomComparator
+
+
+def learned_dyck_automata(seeds=range(5)) -> list[tuple[str, TreeAutomata]]:
+    """
+    Learns Dyck1 with TL* (through the VPL* oracle) once per seed and returns the raw hypotheses.
+    """
+    automata = []
+    dyck = Dyck1()
+    for seed in seeds:
+        random.seed(seed)
+        oracle = VPLStarOracle(dyck)
+        tl_star = TLStar(oracle, VPLRandomComparator(dyck.alphabet, seed=seed))
+        automata.append((f"dyck1 seed={seed}", tl_star.learn()))
+    return automata
+
+
+def run_benchmark(n_trees: int = 2000, max_depth: int = 6):
+    alphabet = Dyck1().alphabet
+    automata = learned_dyck_automata()
+    automata.append(("t_b_parse", get_t_b_parse(alphabet)))
+    automata.append(("most permissive", get_most_permissive_vpg_as_tree_automaton(vpalphabet_2_ranked(alphabet))))
+
+    trees = TreeGenerator(vpalphabet_2_ranked(alphabet), seed=0).generate_trees(n_trees, max_depth)
+
+    print("Minimization of Dyck automata")
+    print(f"{'automaton':>18} {'states':>10} {'transitions':>12} {'vpg rules':>10} "
+          f"{'minimize ms':>12} {'accept ms':>14}")
+    for name, automaton in automata:
+        start = time.perf_counter()
+        minimal = automaton.minimize()
+        minimize_time = time.perf_counter() - start
+
+        accept_times = []
+        for candidate in (automaton, minimal):
+            start = time.perf_counter()
+            for tree in trees:
+                candidate.is_accepted(tree)
+            accept_times.append(time.perf_counter() - start)
+
+        rules = [len(vpg_from_tree_automata(candidate, alphabet).rules) for candidate in (automaton, minimal)]
+        print(f"{name:>18} {_n_states(automaton):>4} -> {_n_states(minimal):<3} "
+              f"{len(automaton.transitions):>5} -> {len(minimal.transitions):<4} "
+              f"{rules[0]:>3} -> {rules[1]:<3} {minimize_time * 1000:>12.2f} "
+              f"{accept_times[0] * 1000:>6.1f} -> {accept_times[1] * 1000:<6.1f}")
+
+
+def _n_states(automaton: TreeAutomata) -> int:
+    # Some automata (e.g. T(B_parse)) use states that are not declared in `states`.
+    return len(set(automaton.states) | set(automaton.transitions.values()))
+
+
+if __name__ == "__main__":
+    run_benchmark()
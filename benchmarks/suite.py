@@ -0,0 +1,331 @@
+"""
+Reproducible benchmark suite.
+
+    python -m benchmarks.suite                                   # run every benchmark
+    python -m benchmarks.suite --filter learn                    # only the names containing 'learn'
+    python -m benchmarks.suite --save benchmarks/baseline.json   # record a baseline
+    python -m benchmarks.suite --compare benchmarks/baseline.json
+
+Every benchmark is run `repeat` times for the timing (best and median wall time)
+and once more under tracemalloc for the peak memory. Seeds (and the hash seed) are
+fixed, so the query counts of the learners are deterministic: a change in them is
+reported as well.
+Baselines depend on the machine, so they are not committed.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+from base.tree import Tree, Context, context_node
+from benchmarks.tree_automata_benchmark import random_tree_automaton
+from examples.dyck1 import Dyck1
+from examples.dyck3 import Dyck3
+from examples.synthetic_vpl import Dyck, BoundedDyck, DyckCounter, RandomVPA, random_well_matched_words
+from examples.tree_automata_example import tree_automaton, simple_tree_automaton
+from tree_automata.tree_generator import TreeGenerator
+from tree_automata_extraction.tl_star import TLStar
+from utils.encoding import get_codec, sequence_2_tree
+from utils.metrics import LearningMetrics, MetricsCollector
+from utils.well_formed import is_well_formed
+from vpl_extraction.vpl_star import VPLStar
+
+DYCK1_CORPUS = 'data/dyck-1_10000-samples_16-len_p05.jsonl'
+DYCK3_CORPUS = 'data/dyck-3_15000-samples_16-len_p05.jsonl'
+
+
+class Benchmark(NamedTuple):
+    name: str
+    # Builds the inputs (not timed) and returns the timed function, which returns its counts.
+    setup: Callable[[], Callable[[], dict]]
+    repeat: int = 5
+
+
+BENCHMARKS: dict[str, Benchmark] = {}
+
+
+def benchmark(name: str, repeat: int = 5):
+    """
+    Registers a setup function as a benchmark.
+    """
+    def register(setup):
+        BENCHMARKS[name] = Benchmark(name, setup, repeat)
+        return setup
+    return register
+
+
+def load_corpus(path: str) -> list[tuple[str, bool]]:
+    with open(path, encoding='utf-8') as file:
+        return [tuple(json.loads(line)) for line in file if line.strip()]
+
+
+class CorpusComparator:
+    """
+    An equivalence oracle that looks for a counterexample in a labelled corpus of sequences.
+    The corpus is encoded once, and every hypothesis classifies it in a single batch.
+    """
+
+    def __init__(self, alphabet, corpus: list[tuple[str, bool]]):
+        labels = dict(corpus)
+        sequences = list(labels)
+        self.batch, well_formed = get_codec(alphabet).sequences_to_flat(sequences)
+        self.labels = np.array([labels[sequence] for sequence in sequences], dtype=bool)[well_formed]
+
+    def get_counter_example(self, tree_automata, oracle):
+        disagreements = np.flatnonzero(tree_automata.accept_batch(self.batch) != self.labels)
+        return self.batch.get_tree(disagreements[0]) if len(disagreements) else None
+
+
+def _learning_counts(collector: MetricsCollector, n_states: int) -> dict:
+    totals = collector.totals()
+    return {'rounds': totals['rounds'], **totals['counts'], 'states': n_states}
+
+
+def _tl_star(target, seed: int = 0) -> Callable[[], dict]:
+    def run():
+        random.seed(seed)
+        collector = MetricsCollector()
+        learned = TLStar(target, metrics=LearningMetrics(collector)).learn()
+        return _learning_counts(collector, len(learned.states))
+    return run
+
+
+def _vpl_star(language, corpus_path: str = None, seed: int = 0) -> Callable[[], dict]:
+    if corpus_path is not None:
+        corpus = load_corpus(corpus_path)
+    else:
+        # Synthetic targets are compared on random well-matched words, labelled by their batch oracle.
+        sequences = random_well_matched_words(language.alphabet, 2000, 16, seed=seed)
+        corpus = list(zip(sequences, language.is_accepted_batch(sequences)))
+    comparator = CorpusComparator(language.alphabet, corpus)
+
+    def run():
+        random.seed(seed)
+        collector = MetricsCollector()
+        learner = VPLStar(language, comparator, metrics=LearningMetrics(collector))
+        learner.learn()
+        return _learning_counts(collector, len(learner.TLStar.observation_table.S))
+    return run
+
+
+# End-to-end learning.
+
+@benchmark('learn.tl_star.simple')
+def learn_tl_star_simple():
+    return _tl_star(simple_tree_automaton)
+
+
+@benchmark('learn.tl_star.drewes')
+def learn_tl_star_drewes():
+    return _tl_star(tree_automaton)
+
+
+@benchmark('learn.tl_star.random_8')
+def learn_tl_star_random_8():
+    return _tl_star(random_tree_automaton(8, seed=0))
+
+
+@benchmark('learn.tl_star.random_16', repeat=1)
+def learn_tl_star_random_16():
+    return _tl_star(random_tree_automaton(16, seed=0))
+
+
+@benchmark('learn.vpl_star.dyck1')
+def learn_vpl_star_dyck1():
+    return _vpl_star(Dyck1(), DYCK1_CORPUS)
+
+
+@benchmark('learn.vpl_star.dyck3')
+def learn_vpl_star_dyck3():
+    return _vpl_star(Dyck3(), DYCK3_CORPUS)
+
+
+# Learner scaling on the synthetic VPL families.
+
+for k in (2, 4, 8):
+    benchmark(f'scale.dyck_{k}')(lambda k=k: _vpl_star(Dyck(k)))
+for max_depth in (2, 3, 4):
+    benchmark(f'scale.bounded_dyck_2x{max_depth}')(lambda max_depth=max_depth: _vpl_star(BoundedDyck(2, max_depth)))
+for modulus in (2, 3, 5):
+    benchmark(f'scale.dyck_counter_mod_{modulus}')(lambda modulus=modulus: _vpl_star(DyckCounter(2, 2, modulus)))
+# Random VPAs need far larger tree automata than their number of states, so they stay small.
+for n_states in (2, 3):
+    benchmark(f'scale.random_vpa_{n_states}', repeat=1)(lambda n_states=n_states: _vpl_star(RandomVPA(n_states, seed=1)))
+
+
+# Micro-benchmarks.
+
+@benchmark('micro.is_accepted')
+def micro_is_accepted():
+    automaton = random_tree_automaton(16, seed=0)
+    trees = TreeGenerator(automaton.alphabet, seed=0).generate_trees(2000, 6)
+
+    def run():
+        return {'accepted': sum(automaton.is_accepted(tree) for tree in trees)}
+    return run
+
+
+@benchmark('micro.sequence_2_tree')
+def micro_sequence_2_tree():
+    alphabet = Dyck3().alphabet
+    sequences = [sequence for sequence, _ in load_corpus(DYCK3_CORPUS) if is_well_formed(sequence, alphabet)]
+
+    def run():
+        return {'nodes': sum(sequence_2_tree(sequence, alphabet).size() for sequence in sequences)}
+    return run
+
+
+@benchmark('micro.apply_context')
+def micro_apply_context():
+    generator = TreeGenerator(random_tree_automaton(4, seed=0).alphabet, seed=0)
+    trees = generator.generate_trees(200, 4)
+    # Contexts with the hole at the leftmost leaf of random trees.
+    contexts = []
+    for tree in generator.generate_trees(50, 5):
+        path, node = (), tree
+        while node.children:
+            path, node = path + (0,), node.children[0]
+        contexts.append(Context(_replace_leaf(tree, path), path))
+
+    def run():
+        return {'applied': sum(1 for context in contexts for tree in trees if tree.apply_context(context) is not None)}
+    return run
+
+
+@benchmark('micro.synthetic.accept_encoded')
+def micro_synthetic_accept_encoded():
+    language = RandomVPA(64, 3, 2, seed=0)
+    codes, offsets = language.alphabet.encode_batch(random_well_matched_words(language.alphabet, 100000, 16, seed=0))
+
+    def run():
+        return {'accepted': int(language.accept_encoded(codes, offsets).sum())}
+    return run
+
+
+def _replace_leaf(tree, path):
+    if not path:
+        return context_node
+    children = list(tree.children)
+    children[path[0]] = _replace_leaf(children[path[0]], path[1:])
+    return Tree(tree.root, children)
+
+
+@benchmark('micro.observation_table.complete')
+def micro_observation_table_complete():
+    learner = TLStar(random_tree_automaton(8, seed=0))
+    learner.learn()
+    table = learner.observation_table
+
+    def run():
+        # S is emptied, so complete has to promote a representative of every row again.
+        for _ in range(200):
+            table.S.clear()
+            table._reindex_S()
+            table.complete()
+        return {'S': len(table.S), 'R': len(table.R)}
+    return run
+
+
+def run_benchmark(bench: Benchmark, repeat: int | None = None) -> dict:
+    """
+    Runs a benchmark, returning its best and median time, its peak memory and its counts.
+    """
+    run = bench.setup()
+    times = []
+    counts = None
+    for _ in range(repeat or bench.repeat):
+        start = time.perf_counter()
+        counts = run()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        run()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'min': min(times),
+        'median': statistics.median(times),
+        'repeat': len(times),
+        'peak_memory': peak_memory,
+        'counts': counts,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Returns the regressions of the results against a baseline: a best time or a peak memory
+    above the baseline by more than the tolerance, or different counts.
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if result['min'] > reference['min'] * (1 + tolerance):
+            regressions.append(f"{name}: time {reference['min'] * 1e3:.2f}ms -> {result['min'] * 1e3:.2f}ms")
+        if result['peak_memory'] > reference['peak_memory'] * (1 + tolerance):
+            regressions.append(f"{name}: peak memory {reference['peak_memory']} -> {result['peak_memory']} bytes")
+        if result['counts'] != reference['counts']:
+            regressions.append(f"{name}: counts {reference['counts']} -> {result['counts']}")
+    return regressions
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Learning performance benchmarks.")
+    parser.add_argument('--filter', default='', help="Only run the benchmarks whose name contains this string.")
+    parser.add_argument('--repeat', type=int, default=None, help="Timed runs per benchmark (default: per benchmark).")
+    parser.add_argument('--save', metavar='PATH', help="Write the results as a JSON baseline.")
+    parser.add_argument('--compare', metavar='PATH', help="Compare the results against a JSON baseline.")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed relative slowdown (default: 0.25).")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)['benchmarks']
+
+    results = {}
+    print(f"{'benchmark':<34} {'best ms':>10} {'median ms':>10} {'peak KiB':>10} {'vs base':>8}  counts")
+    for name, bench in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        result = results[name] = run_benchmark(bench, args.repeat)
+        ratio = f"{result['min'] / baseline[name]['min']:.2f}x" if name in baseline else ''
+        print(f"{name:<34} {result['min'] * 1e3:>10.2f} {result['median'] * 1e3:>10.2f} "
+              f"{result['peak_memory'] / 1024:>10.1f} {ratio:>8}  {result['counts']}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as file:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'numpy': np.__version__,
+                'benchmarks': results,
+            }, file, indent=2)
+
+    if args.compare:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    # The tables iterate over sets of trees, whose order follows the string hashes: the hash
+    # seed is fixed so that the query counts are the same from one run to the next.
+    if os.environ.get('PYTHONHASHSEED') != '0':
+        os.execve(sys.executable, [sys.executable, '-m', 'benchmarks.suite', *sys.argv[1:]],
+                  {**os.environ, 'PYTHONHASHSEED': '0'})
+    sys.exit(main())
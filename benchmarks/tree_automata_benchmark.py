@@ -0,0 +1,50 @@
+import random
+import time
+from base.tree import TreeSymbol
+from base.alphabet import RankedAlphabet
+from tree_automata.tree_automata import TreeAutomata
+from tree_automata.tree_state import TreeAutomataState, TreeAutomataTransitionKey
+from tree_automata.tree_generator import TreeGenerator
+
+
+def random_tree_automaton(n_states: int, n_binary_symbols: int = 2, seed: int = 0) -> TreeAutomata:
+    """
+    Builds a complete random tree automaton with one leaf symbol and
+    `n_binary_symbols` binary symbols, so it has 1 + n_binary_symbols * n_states^2 transitions.
+    """
+    rng = random.Random(seed)
+    states = [TreeAutomataState(f"q{i}") for i in range(n_states)]
+    leaf = TreeSymbol('e', 0)
+    binary_symbols = [TreeSymbol(f"f{i}", 2) for i in range(n_binary_symbols)]
+    alphabet = RankedAlphabet({leaf, *binary_symbols}, "RandomAlphabet")
+
+    transitions = {TreeAutomataTransitionKey(leaf, []): states[0]}
+    for symbol in binary_symbols:
+        for left in states:
+            for right in states:
+                transitions[TreeAutomataTransitionKey(symbol, [left, right])] = rng.choice(states)
+
+    final_states = set(rng.sample(states, max(1, n_states // 2)))
+    return TreeAutomata(set(states), alphabet, final_states, transitions)
+
+
+def run_benchmark(state_counts=(2, 4, 8, 16, 32, 64), n_trees: int = 500, max_depth: int = 5):
+    print("Acceptance throughput vs transition count")
+    print(f"{'states':>8} {'transitions':>12} {'trees/s':>12} {'nodes/s':>12}")
+    random.seed(0)
+    for n_states in state_counts:
+        automaton = random_tree_automaton(n_states)
+        trees = TreeGenerator(automaton.alphabet).generate_trees(n_trees, max_depth)
+        nodes = sum(tree.size() for tree in trees)
+
+        start = time.perf_counter()
+        for tree in trees:
+            automaton.is_accepted(tree)
+        elapsed = time.perf_counter() - start
+
+        print(f"{n_states:>8} {len(automaton.transitions):>12} "
+              f"{n_trees / elapsed:>12.0f} {nodes / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -16,6 +16,10 @@ class Dyck1(VPL):
         )
         super().__init__(self.alphabet)
 
+    def identity(self) -> str:
+        # Un lenguaje fijo, sin parámetros: la clase lo identifica.
+        return "Dyck1"
+
 
     def is_accepted(self, sequence: str) -> bool:
         """
@@ -0,0 +1,40 @@
+from base.vpl import VPL
+from base.alphabet import VPAlphabet
+
+class Dyck3(VPL):
+    """
+    Dyck3 language is the language of well-formed sequences of three kinds of brackets: (), [] and {}.
+    It is the language of the data/dyck-3 corpus.
+    """
+
+    pairs = {')': '(', ']': '[', '}': '{'}
+
+    def __init__(self):
+        self.alphabet = VPAlphabet(
+            push_symbols={'(', '[', '{'},
+            pop_symbols={')', ']', '}'},
+            int_symbols={},
+            name='Dyck3Alphabet'
+        )
+        super().__init__(self.alphabet)
+
+    def identity(self) -> str:
+        # Un lenguaje fijo, sin parámetros: la clase lo identifica.
+        return "Dyck3"
+
+
+    def is_accepted(self, sequence: str) -> bool:
+        """
+        Check if the sequence is a well-formed Dyck3 sequence.
+        """
+
+        stack = []
+        for char in sequence:
+            if char in self.pairs:
+                if not stack or stack.pop() != self.pairs[char]:
+                    return False
+            elif char in self.alphabet.push_symbols:
+                stack.append(char)
+            else:
+                return False
+        return not stack
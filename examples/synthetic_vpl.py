@@ -0,0 +1,292 @@
+import hashlib
+import numpy as np
+from base.vpl import VPL
+from base.alphabet import VPAlphabet, INTERNAL, PUSH, POP
+
+# Pares de paréntesis disponibles: primero los clásicos y después letras (minúscula abre, mayúscula cierra).
+BRACKETS = [('(', ')'), ('[', ']'), ('{', '}'), ('<', '>')] + \
+    [(chr(ord('a') + i), chr(ord('A') + i)) for i in range(26)]
+INTERNAL_SYMBOLS = [str(i) for i in range(10)]
+
+
+def synthetic_alphabet(n_brackets: int, n_internal: int = 0, name: str = 'SyntheticAlphabet') -> VPAlphabet:
+    """
+    An alphabet of single-character symbols: n_brackets push/pop pairs and n_internal digits.
+    """
+    if not 0 < n_brackets <= len(BRACKETS):
+        raise ValueError(f"The number of bracket types must be between 1 and {len(BRACKETS)}.")
+    if not 0 <= n_internal <= len(INTERNAL_SYMBOLS):
+        raise ValueError(f"The number of internal symbols must be between 0 and {len(INTERNAL_SYMBOLS)}.")
+    return VPAlphabet(
+        push_symbols={push for push, _ in BRACKETS[:n_brackets]},
+        pop_symbols={pop for _, pop in BRACKETS[:n_brackets]},
+        int_symbols=set(INTERNAL_SYMBOLS[:n_internal]),
+        name=name
+    )
+
+
+class TableVPA(VPL):
+    """
+    A complete deterministic VPA given by NumPy transition tables.
+
+    Symbols are numbered inside their kind following `alphabet.symbols`. A push
+    stores the pair (current state, push symbol) on the stack, and a pop reads it back:
+        - internal c:   state = internal[state, c]
+        - push a:       (state, a) is pushed and state = push[state, a]
+        - pop b:        (caller, a) is popped and state = pop[state, caller, a, b]
+    A sequence is accepted if it is well-matched and ends in an accepting state.
+
+    `accept_encoded` runs every sequence of an encoded batch at the same time, one
+    position per step, with the states, stacks and depths of all the runs in arrays.
+    """
+
+    def __init__(self, alphabet: VPAlphabet, internal: np.ndarray, push: np.ndarray,
+                 pop: np.ndarray, accepting: np.ndarray, initial_state: int = 0):
+        super().__init__(alphabet)
+        self.internal = np.asarray(internal, dtype=np.int64)
+        self.push = np.asarray(push, dtype=np.int64)
+        self.pop = np.asarray(pop, dtype=np.int64)
+        self.accepting = np.asarray(accepting, dtype=bool)
+        self.initial_state = initial_state
+
+        # The index of every symbol inside its kind, from its index in the alphabet.
+        n_internal = len(alphabet.int_symbols)
+        n_push = len(alphabet.push_symbols)
+        self.local_index = np.arange(len(alphabet.symbols)) - np.select(
+            [alphabet.symbol_kinds == PUSH, alphabet.symbol_kinds == POP], [n_internal, n_internal + n_push], 0
+        )
+        self._symbols = {
+            symbol: (int(kind), int(index))
+            for symbol, kind, index in zip(alphabet.symbols, alphabet.symbol_kinds, self.local_index)
+        }
+        self._internal = self.internal.tolist()
+        self._push = self.push.tolist()
+        self._pop = self.pop.tolist()
+        self._accepting = self.accepting.tolist()
+
+    @property
+    def n_states(self) -> int:
+        return len(self.accepting)
+
+    def is_accepted(self, sequence: str) -> bool:
+        state = self.initial_state
+        stack = []
+        for symbol in sequence:
+            kind, index = self._symbols.get(symbol, (None, None))
+            if kind == INTERNAL:
+                state = self._internal[state][index]
+            elif kind == PUSH:
+                stack.append((state, index))
+                state = self._push[state][index]
+            elif kind == POP:
+                if not stack:
+                    return False
+                caller, push_index = stack.pop()
+                state = self._pop[state][caller][push_index][index]
+            else:
+                return False
+        return not stack and self._accepting[state]
+
+    def is_accepted_batch(self, sequences: list[str]) -> list[bool]:
+        return self.accept_encoded(*self.alphabet.encode_batch(sequences)).tolist()
+
+    def accept_encoded(self, codes: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        """
+        Classifies a batch encoded with `alphabet.encode_batch`, returning a boolean vector.
+        """
+        lengths = np.diff(offsets)
+        n_sequences = len(lengths)
+        max_length = int(lengths.max(initial=0))
+
+        # Matriz (posición, secuencia) de índices de símbolo, para leer cada posición contigua; -2 marca el relleno.
+        matrix = np.full((max_length, n_sequences), -2, dtype=np.int64)
+        owners = np.repeat(np.arange(n_sequences), lengths)
+        matrix[np.arange(len(codes)) - offsets[owners], owners] = codes
+
+        kinds = np.append(self.alphabet.symbol_kinds, np.int8([-1, -1]))
+        local_index = np.append(self.local_index, [0, 0])
+        n_push = self.push.shape[1]
+        # The stack holds caller * n_push + push symbol, so a pop is a single lookup.
+        pop = self.pop.reshape(self.n_states, -1, self.pop.shape[3])
+        state = np.full(n_sequences, self.initial_state, dtype=np.int64)
+        depth = np.zeros(n_sequences, dtype=np.int64)
+        stack = np.zeros((max_length, n_sequences), dtype=np.int64)
+        # Unknown symbols and unmatched pops reject the sequence.
+        failed = (matrix == -1).any(axis=0)
+
+        for column in matrix:
+            kind = np.where(failed, -1, kinds[column])  # -1 and -2 read the two extra kinds, -1
+            index = local_index[column]
+
+            rows = np.flatnonzero(kind == INTERNAL)
+            state[rows] = self.internal[state[rows], index[rows]]
+
+            rows = np.flatnonzero(kind == PUSH)
+            stack[depth[rows], rows] = state[rows] * n_push + index[rows]
+            depth[rows] += 1
+            state[rows] = self.push[state[rows], index[rows]]
+
+            rows = np.flatnonzero(kind == POP)
+            unmatched = depth[rows] == 0
+            failed[rows[unmatched]] = True
+            rows = rows[~unmatched]
+            depth[rows] -= 1
+            state[rows] = pop[state[rows], stack[depth[rows], rows], index[rows]]
+
+        return ~failed & (depth == 0) & self.accepting[state]
+
+    def identity(self) -> str:
+        """
+        The hash of the language itself: the transition tables, the initial state and the symbols.
+        """
+        digest = hashlib.sha256()
+        for table in (self.internal, self.push, self.pop, self.accepting):
+            digest.update(repr(table.shape).encode())
+            digest.update(table.tobytes())
+        digest.update(f"{self.initial_state}|{'|'.join(self.alphabet.symbols)}".encode())
+        return f"{type(self).__qualname__}:{digest.hexdigest()}"
+
+
+def _matching(alphabet: VPAlphabet) -> np.ndarray:
+    """
+    matching[a, b] holds if the push symbol a and the pop symbol b are a bracket pair.
+    """
+    push_symbols = [symbol for symbol in alphabet.symbols if alphabet.kinds[symbol] == PUSH]
+    pop_symbols = [symbol for symbol in alphabet.symbols if alphabet.kinds[symbol] == POP]
+    pairs = set(BRACKETS)
+    return np.array([[(push, pop) in pairs for pop in pop_symbols] for push in push_symbols], dtype=bool)
+
+
+class Dyck(TableVPA):
+    """
+    Dyck-k: the well-matched sequences of k kinds of brackets.
+    States: 0 while every bracket matched so far, 1 once a pair did not match.
+    """
+
+    def __init__(self, k: int):
+        alphabet = synthetic_alphabet(k, name=f'Dyck{k}Alphabet')
+        ok, dead = 0, 1
+        states = np.arange(2)
+        # pop[state, caller, a, b]: back to the caller if the pair matches and nothing failed inside.
+        pop = np.where(
+            _matching(alphabet)[None, None, :, :] & (states[:, None, None, None] == ok),
+            states[None, :, None, None], dead
+        )
+        super().__init__(
+            alphabet,
+            internal=np.zeros((2, 0)),
+            push=np.repeat(states[:, None], k, axis=1),
+            pop=np.broadcast_to(pop, (2, 2, k, k)),
+            accepting=states == ok
+        )
+        self.k = k
+
+
+class BoundedDyck(TableVPA):
+    """
+    Dyck-k restricted to sequences whose nesting depth is at most max_depth.
+    The state is the current depth, and max_depth + 1 is the dead state.
+    """
+
+    def __init__(self, k: int, max_depth: int):
+        alphabet = synthetic_alphabet(k, name=f'BoundedDyck{k}x{max_depth}Alphabet')
+        dead = max_depth + 1
+        states = np.arange(max_depth + 2)
+        push = np.where(states < max_depth, states + 1, dead)
+        pop = np.where(
+            _matching(alphabet)[None, None, :, :] & (states[:, None, None, None] != dead),
+            states[None, :, None, None], dead
+        )
+        super().__init__(
+            alphabet,
+            internal=np.zeros((max_depth + 2, 0)),
+            push=np.repeat(push[:, None], k, axis=1),
+            pop=np.broadcast_to(pop, (max_depth + 2, max_depth + 2, k, k)),
+            accepting=states == 0
+        )
+        self.k = k
+        self.max_depth = max_depth
+
+
+class DyckCounter(TableVPA):
+    """
+    Dyck-k with internal symbols 0, 1, ... anywhere, where the sum of (symbol + 1)
+    over the internal symbols must be 0 mod modulus.
+    The state is the running sum mod modulus, and modulus is the dead state.
+    """
+
+    def __init__(self, k: int, n_internal: int, modulus: int):
+        alphabet = synthetic_alphabet(k, n_internal, name=f'DyckCounter{k}x{n_internal}mod{modulus}Alphabet')
+        dead = modulus
+        states = np.arange(modulus + 1)
+        internal = np.where(
+            states[:, None] != dead, (states[:, None] + np.arange(1, n_internal + 1)[None, :]) % modulus, dead
+        )
+        # The sum goes on inside the brackets, so a pop keeps the current state.
+        pop = np.where(
+            _matching(alphabet)[None, None, :, :] & (states[:, None, None, None] != dead),
+            states[:, None, None, None], dead
+        )
+        super().__init__(
+            alphabet,
+            internal=internal,
+            push=np.repeat(states[:, None], k, axis=1),
+            pop=np.broadcast_to(pop, (modulus + 1, modulus + 1, k, k)),
+            accepting=states == 0
+        )
+        self.k = k
+        self.n_internal = n_internal
+        self.modulus = modulus
+
+
+class RandomVPA(TableVPA):
+    """
+    A random complete deterministic VPA with n_states states. Every transition goes to
+    a uniformly drawn state and every state is accepting with probability accepting_rate.
+    """
+
+    def __init__(self, n_states: int, n_brackets: int = 2, n_internal: int = 1,
+                 accepting_rate: float = 0.5, seed: int = None):
+        alphabet = synthetic_alphabet(n_brackets, n_internal,
+                                      name=f'RandomVPA{n_states}x{n_brackets}x{n_internal}Alphabet')
+        rng = np.random.default_rng(seed)
+        accepting = rng.random(n_states) < accepting_rate
+        accepting[rng.integers(n_states)] = True
+        super().__init__(
+            alphabet,
+            internal=rng.integers(n_states, size=(n_states, n_internal)),
+            push=rng.integers(n_states, size=(n_states, n_brackets)),
+            pop=rng.integers(n_states, size=(n_states, n_states, n_brackets, n_brackets)),
+            accepting=accepting
+        )
+        self.seed = seed
+
+
+def random_well_matched_words(alphabet: VPAlphabet, n_words: int, max_length: int, seed: int = None) -> list[str]:
+    """
+    Draws well-matched words of length up to max_length, with uniformly chosen symbols.
+    Only well-matched words have a tree, so they are the useful samples to compare a hypothesis with.
+    """
+    rng = np.random.default_rng(seed)
+    int_symbols = sorted(alphabet.int_symbols)
+    push_symbols = sorted(alphabet.push_symbols)
+    pop_symbols = sorted(alphabet.pop_symbols)
+    words = []
+    for length in rng.integers(max_length + 1, size=n_words).tolist():
+        word = []
+        depth = 0
+        for remaining in range(length, 0, -1):
+            options = []
+            if int_symbols and remaining > depth:
+                options.append(int_symbols)
+            if remaining > depth + 1:
+                options.append(push_symbols)
+            if depth > 0:
+                options.append(pop_symbols)
+            if not options:
+                break
+            symbols = options[rng.integers(len(options))]
+            word.append(symbols[rng.integers(len(symbols))])
+            depth += 1 if symbols is push_symbols else -1 if symbols is pop_symbols else 0
+        words.append(''.join(word))
+    return words
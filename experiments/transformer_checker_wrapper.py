@@ -1,5 +1,6 @@
 import torch
 import json
+import hashlib
 from base.vpl import VPL
 from base.alphabet import VPAlphabet
 from transformer_checker.transformer import (
@@ -9,15 +10,18 @@ from transformer_checker.transformer import (
 from transformer_checker.dataset.dyck_language_dataset import DyckLanguageTokenizer
 
 class TransformerWrapper(VPL):
-    def __init__(self, metadata_path: str, alphabet: VPAlphabet, tokenizer = None):
+    def __init__(self, metadata_path: str, alphabet: VPAlphabet, tokenizer = None, batch_size: int = 256):
         self.alphabet = alphabet
-        self.alphabet_symbols = list(self.alphabet.get_all_symbols())
+        self.batch_size = batch_size
+        # Orden determinista (internos, push, pop; cada uno ordenado): no depende del hash de los strings.
+        self.alphabet_symbols = list(self.alphabet.symbols)
 
 
         self.tokenizer = tokenizer if tokenizer else DyckLanguageTokenizer("".join(self.alphabet_symbols))
 
         self.metadata = self._load_metadata(metadata_path)
         self.model = self._load_model(self.metadata)
+        self._checkpoint_hash = None
 
     
     def _load_metadata(self, metadata_path: str) -> dict:
@@ -53,10 +57,45 @@ class TransformerWrapper(VPL):
         return model
     
     
+    def identity(self) -> str:
+        """
+        The hash of the checkpoint: model config, weights and alphabet order.
+        """
+        if self._checkpoint_hash is None:
+            digest = hashlib.sha256()
+            digest.update(json.dumps(self.metadata.get('model_config'), sort_keys=True).encode())
+            digest.update("".join(self.alphabet_symbols).encode())
+            with open(self.metadata['wheigts_path'], 'rb') as weights:
+                for block in iter(lambda: weights.read(1 << 20), b''):
+                    digest.update(block)
+            self._checkpoint_hash = f"{type(self).__qualname__}:{digest.hexdigest()}"
+        return self._checkpoint_hash
+
     def is_accepted(self, sequence: str) -> bool:
         with torch.no_grad():
             sequence = self.tokenizer.tokenize(sequence)
             transformer_response = self.model(sequence)
             return torch.argmax(transformer_response, 1).item() == 1
 
-    
\ No newline at end of file
+    def is_accepted_batch(self, sequences: list[str]) -> list[bool]:
+        """
+        Classifies many sequences with batched forward passes.
+        Sequences are bucketed by length, so every batch has a single length and
+        needs no padding, and each bucket is split in chunks of `batch_size`.
+        """
+        buckets = {}
+        for index, sequence in enumerate(sequences):
+            buckets.setdefault(len(sequence), []).append(index)
+
+        results = [False] * len(sequences)
+        with torch.no_grad():
+            for indices in buckets.values():
+                for start in range(0, len(indices), self.batch_size):
+                    chunk = indices[start:start + self.batch_size]
+                    batch = torch.cat([
+                        self.tokenizer.tokenize(sequences[index]).reshape(1, -1) for index in chunk
+                    ])
+                    predictions = torch.argmax(self.model(batch), 1).tolist()
+                    for index, prediction in zip(chunk, predictions):
+                        results[index] = prediction == 1
+        return results
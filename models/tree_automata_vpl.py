@@ -1,26 +1,33 @@
 from base.vpl import VPL
 from tree_automata.tree_automata import TreeAutomata
-from utils.well_formed import is_well_formed
 from base.alphabet import VPAlphabet
-
-from utils.encoding import sequence_2_tree
+from models.vpg import VPG, vpg_from_tree_automata
 
 class TreeAutomataVPL(VPL):
     def __init__(self, alphabet: VPAlphabet, tree_automaton: TreeAutomata):
         super().__init__(alphabet)
         self.tree_automaton = tree_automaton
+        self._grammar = None
+
+    @property
+    def grammar(self) -> VPG:
+        """
+        The VPG of the tree automaton, built the first time it is needed.
+        """
+        if self._grammar is None:
+            self._grammar = vpg_from_tree_automata(self.tree_automaton, self.get_alphabet())
+        return self._grammar
 
     def is_accepted(self, sequence: str) -> bool:
         """
         Check if the sequence corresponds to an accepted tree structure.
+        The sequence is parsed in one pass against the grammar of the automaton,
+        which also rejects the sequences that are not well-formed.
         """
+        return self.grammar.is_accepted(sequence)
 
-        # Check if the sequence is well-formed
-        if not is_well_formed(sequence, self.get_alphabet()):
-            return False
-
-        tree = sequence_2_tree(sequence, self.get_alphabet())
-        return self.tree_automaton.is_accepted(tree)
+    def is_accepted_batch(self, sequences: list[str]) -> list[bool]:
+        return self.grammar.is_accepted_batch(sequences)
 
 
 def nta_2_vpg(nta, alphabet: VPAlphabet) -> TreeAutomataVPL:
@@ -1,6 +1,10 @@
-from base.alphabet import VPAlphabet, StackAlphabet, bottom_symbol
+import numpy as np
+from typing import Iterable, Iterator
+from base.alphabet import VPAlphabet, StackAlphabet, bottom_symbol, INTERNAL, PUSH, POP
 from base.state import VPAState, VPATransitions
 from base.vpl import VPL
+from models.vpg import VPG, vpg_from_tree_automata
+from tree_automata.tree_automata import TreeAutomata
 
 class VPA(VPL):
     def __init__(self, alphabet: VPAlphabet, states: set[VPAState], 
@@ -13,50 +17,261 @@ class VPA(VPL):
         self.transitions = transitions
         self.stack_alphabet = stack_alphabet if stack_alphabet \
                                 else StackAlphabet(alphabet.get_push_symbols())
-        self.stack = []
 
-    def _push_symbol(self, symbol: str):
+    # The stack belongs to each run of process_sequence, so the VPA can be shared between threads.
+    def _push_symbol(self, stack: list[str], symbol: str):
         """Push a symbol onto the stack."""
 
-        self.stack.append(symbol)
+        stack.append(symbol)
     
-    def _pop_symbol(self) -> str:
+    def _pop_symbol(self, stack: list[str]) -> str:
         """Pop a symbol from the stack."""
 
-        if not self.stack:
+        if not stack:
             return bottom_symbol
         
-        return self.stack.pop()
+        return stack.pop()
     
-    def _get_top_symbol(self) -> str:
+    def _get_top_symbol(self, stack: list[str]) -> str:
         """Get the top symbol from the stack without popping it."""
 
-        return self.stack[-1]
+        return stack[-1] if stack else bottom_symbol
+
+    def is_accepted(self, sequence: str) -> bool:
+        return self.process_sequence(sequence)
     
     def process_sequence(self, sequence: str) -> bool:
         """
         Process a sequence of symbols and determine if it is accepted by the VPA.
         """
 
+        stack = []
         current_state = self.initial_state
         for symbol in sequence:
             if symbol in self.alphabet.get_push_symbols():
                 push_symbol = self.stack_alphabet.get_push_symbol(symbol)
                 if not push_symbol:
                     return False
-                self._push_symbol(push_symbol)
+                self._push_symbol(stack, push_symbol)
                 current_state = self.transitions.get_push_next_state(current_state, symbol, push_symbol)
             elif symbol in self.alphabet.get_pop_symbols():
                 current_state, pop_symbol = self.transitions.get_pull_transition(current_state, symbol)
-                if self._get_top_symbol() != self.stack_alphabet(pop_symbol):
+                if self._get_top_symbol(stack) != self.stack_alphabet(pop_symbol):
                     return False
-                self._pop_symbol()
+                self._pop_symbol(stack)
             elif symbol in self.alphabet.get_int_symbols():
                 current_state = self.transitions.get_internal_next_state(current_state, symbol)
             else:
                 return False
         return current_state in self.final_states
 
+class DeterministicVPA(VPL):
+    """
+    A complete deterministic VPA stored in integer-indexed NumPy arrays.
+
+    Each state stands for a relation between grammar variables, given as a bitmask
+    of variables per variable: the variables of the current nesting level read so
+    far, followed by a suffix derived from q, can derive the mask of q. Those
+    relations are composed as the sequence is read left to right:
+        - internal c:   state = internal[state, c]
+        - push a:       (state, a) is pushed and the state restarts at the identity
+        - pop b:        (caller, a) is popped and state = pop[caller, a, exit[state], b]
+    `exit[state]` is the id of the set of variables deriving the level read so far,
+    and a sequence is accepted if the stack ends empty and `accepting[state]` holds.
+    Unmatched pushes and pops are rejected, and `dead[state]` marks the states that
+    can no longer lead to acceptance.
+
+    The arrays are never modified and every run keeps its own stack, so one instance
+    can classify sequences from many threads at once.
+    """
+
+    def __init__(self, alphabet: VPAlphabet, push_symbols: list[str], pop_symbols: list[str],
+                 int_symbols: list[str], internal: np.ndarray, pop: np.ndarray, exit: np.ndarray,
+                 accepting: np.ndarray, dead: np.ndarray, initial_state: int = 0):
+        super().__init__(alphabet)
+        self.push_symbols = push_symbols
+        self.pop_symbols = pop_symbols
+        self.int_symbols = int_symbols
+        self.internal = internal
+        self.pop = pop
+        self.exit = exit
+        self.accepting = accepting
+        self.dead = dead
+        self.initial_state = initial_state
+
+        # Tablas en listas anidadas: el acceso escalar es mucho más rápido que con NumPy.
+        self._symbols = {}
+        self._symbols.update({symbol: (INTERNAL, i) for i, symbol in enumerate(int_symbols)})
+        self._symbols.update({symbol: (PUSH, i) for i, symbol in enumerate(push_symbols)})
+        self._symbols.update({symbol: (POP, i) for i, symbol in enumerate(pop_symbols)})
+        self._internal = internal.tolist()
+        self._pop = pop.tolist()
+        self._exit = exit.tolist()
+        self._accepting = accepting.tolist()
+        self._dead = dead.tolist()
+
+    @property
+    def n_states(self) -> int:
+        return len(self.exit)
+
+    def is_accepted(self, sequence: str) -> bool:
+        symbols = self._symbols
+        internal = self._internal
+        pop = self._pop
+        exit = self._exit
+        dead = self._dead
+
+        state = self.initial_state
+        stack = []
+        for symbol in sequence:
+            kind, index = symbols.get(symbol, (None, None))
+            if kind == INTERNAL:
+                state = internal[state][index]
+            elif kind == PUSH:
+                stack.append((state, index))
+                state = self.initial_state
+            elif kind == POP:
+                if not stack:
+                    return False
+                caller, push_index = stack.pop()
+                state = pop[caller][push_index][exit[state]][index]
+            else:
+                return False
+            if dead[state]:
+                return False
+
+        return not stack and self._accepting[state]
+
+    def classify(self, sequences: Iterable[str]) -> Iterator[bool]:
+        """
+        Lazily classifies a stream of sequences.
+        """
+        for sequence in sequences:
+            yield self.is_accepted(sequence)
+
+    def is_accepted_batch(self, sequences: list[str]) -> list[bool]:
+        return list(self.classify(sequences))
+
+
+def vpa_from_vpg(vpg: VPG, alphabet: VPAlphabet) -> DeterministicVPA:
+    """
+    Determinizes a VPG into a complete DeterministicVPA.
+    Only the relations reachable from the identity are built, as a fixpoint over
+    the internal and pop transitions of the states and exits found so far.
+    """
+    push_symbols = sorted(alphabet.get_push_symbols())
+    pop_symbols = sorted(alphabet.get_pop_symbols())
+    int_symbols = sorted(alphabet.get_int_symbols())
+
+    variables = sorted({rule.head for rule in vpg.rules} | {q for rule in vpg.rules for q in rule.body})
+    bits = {variable: 1 << i for i, variable in enumerate(variables)}
+    epsilon = 0
+    internal_rules = {}
+    push_pop_rules = {}
+    for rule in vpg.rules:
+        if rule.kind == "epsilon":
+            epsilon |= bits[rule.head]
+        elif rule.kind == "internal":
+            internal_rules.setdefault((rule.symbols[0], rule.body[0]), []).append(bits[rule.head])
+        else:
+            push_pop_rules.setdefault(rule.symbols, []).append((bits[rule.body[0]], rule.body[1], bits[rule.head]))
+    start = 0
+    for start_symbol in vpg.start_symbols:
+        variable_name = vpg.variable_map.get(start_symbol)
+        for variable in variables:
+            if VPG.variable_name(variable) == variable_name:
+                start |= bits[variable]
+
+    def apply(relation: tuple[int, ...], mask: int) -> int:
+        result = 0
+        for i, image in enumerate(relation):
+            if mask >> i & 1:
+                result |= image
+        return result
+
+    def compose(relation: tuple[int, ...], step: dict[int, int]) -> tuple[int, ...]:
+        # (relation ∘ step)(q) = relation(step(q))
+        return tuple(apply(relation, step.get(variable, 0)) for variable in variables)
+
+    identity = tuple(bits[variable] for variable in variables)
+    states = [identity]
+    state_ids = {identity: 0}
+    exits = []
+    exit_ids = {}
+    state_exits = []
+
+    def state_id(relation: tuple[int, ...]) -> int:
+        if relation not in state_ids:
+            state_ids[relation] = len(states)
+            states.append(relation)
+        return state_ids[relation]
+
+    internal_steps = []
+    for c in int_symbols:
+        step = {}
+        for (symbol, variable), heads in internal_rules.items():
+            if symbol == c:
+                for head in heads:
+                    step[variable] = step.get(variable, 0) | head
+        internal_steps.append(step)
+
+    internal = {}
+    pop = {}
+    expanded = 0
+    while expanded < len(states):
+        while expanded < len(states):
+            relation = states[expanded]
+            exit_mask = apply(relation, epsilon)
+            if exit_mask not in exit_ids:
+                exit_ids[exit_mask] = len(exits)
+                exits.append(exit_mask)
+            state_exits.append(exit_ids[exit_mask])
+            for c_index, step in enumerate(internal_steps):
+                internal[expanded, c_index] = state_id(compose(relation, step))
+            expanded += 1
+
+        # Pops from every known caller, with every known inner level; new states are expanded in the next round.
+        for caller in range(len(states)):
+            for a_index, a in enumerate(push_symbols):
+                for exit_index, exit_mask in enumerate(exits):
+                    for b_index, b in enumerate(pop_symbols):
+                        if (caller, a_index, exit_index, b_index) in pop:
+                            continue
+                        # g(q) = heads of q^ → a p b q with p deriving the inner level.
+                        step = {}
+                        for p_bit, q, head in push_pop_rules.get((a, b), ()):
+                            if exit_mask & p_bit:
+                                step[q] = step.get(q, 0) | head
+                        pop[caller, a_index, exit_index, b_index] = state_id(compose(states[caller], step))
+
+    n_states = len(states)
+    internal_array = np.zeros((n_states, len(int_symbols)), dtype=np.int32)
+    for (state, c_index), target in internal.items():
+        internal_array[state, c_index] = target
+    pop_array = np.zeros((n_states, len(push_symbols), len(exits), len(pop_symbols)), dtype=np.int32)
+    for index, target in pop.items():
+        pop_array[index] = target
+
+    return DeterministicVPA(
+        alphabet=alphabet,
+        push_symbols=push_symbols,
+        pop_symbols=pop_symbols,
+        int_symbols=int_symbols,
+        internal=internal_array,
+        pop=pop_array,
+        exit=np.array(state_exits, dtype=np.int32),
+        accepting=np.array([bool(apply(relation, epsilon) & start) for relation in states], dtype=bool),
+        dead=np.array([not any(relation) for relation in states], dtype=bool),
+    )
+
+
+def vpa_from_tree_automata(tree_automata: TreeAutomata, alphabet: VPAlphabet) -> DeterministicVPA:
+    """
+    Builds the DeterministicVPA of a (learned) tree automaton through its VPG.
+    """
+    return vpa_from_vpg(vpg_from_tree_automata(tree_automata, alphabet), alphabet)
+
+
 def most_permossive(alphabet):
     """
     Create a most permissive VPA with the given alphabet.
@@ -1,3 +1,4 @@
+from typing import NamedTuple
 from tree_automata.tree_automata import (
     TreeAutomata,
     TreeAutomataTransitionKey,
@@ -5,13 +6,27 @@ from tree_automata.tree_automata import (
 )
 from base.alphabet import VPAlphabet
 
+
+class VPGRule(NamedTuple):
+    """
+    A grammar rule over integer variable ids (variable i is named q{i}).
+        - epsilon:  head → ε                        symbols = (),     body = ()
+        - internal: head → c body[0]                symbols = (c,),   body = (q,)
+        - push-pop: head → a body[0] b body[1]      symbols = (a, b), body = (p, q)
+    """
+    kind: str
+    head: int
+    symbols: tuple[str, ...]
+    body: tuple[int, ...]
+
+
 class VPG:
 
     def __init__(
         self, 
         variables: set[str],
         start_symbols: set[str], 
-        rules: tuple[str, str, str],
+        rules: list[VPGRule],
         variable_map: dict[str, str] = {},
         name: str = "VPG"
     ):
@@ -20,7 +35,94 @@ class VPG:
         self.start_symbols = start_symbols
         self.variable_map = variable_map
         self.rules = rules
+        # Tablas del reconocedor, construidas la primera vez que se usan.
+        self._recognizer = None
+
+    @staticmethod
+    def variable_name(variable: int) -> str:
+        return f"q{variable}"
+
+    def rule_to_str(self, rule: VPGRule) -> str:
+        """
+        Formats a rule as `head -> right-hand side`.
+        """
+        if rule.kind == "epsilon":
+            right_side = "ε"
+        elif rule.kind == "internal":
+            right_side = f"{rule.symbols[0]} {self.variable_name(rule.body[0])}"
+        else:
+            right_side = f"{rule.symbols[0]} {self.variable_name(rule.body[0])} " \
+                         f"{rule.symbols[1]} {self.variable_name(rule.body[1])}"
+        return f"{self.variable_name(rule.head)} -> {right_side}"
+
+    def _build_recognizer(self):
+        """
+        Indexes the rules by their right-hand side:
+            - epsilon:  heads of q → ε
+            - internal: (c, q) → heads of q' → cq
+            - push_pop: (a, b, p, q) → heads of q^ → apbq
+        plus the start variables (the final states of the automaton the grammar comes from).
+        """
+        epsilon = set()
+        internal = {}
+        push_pop = {}
+        variable_ids = {}
+        for rule in self.rules:
+            variable_ids[self.variable_name(rule.head)] = rule.head
+            if rule.kind == "epsilon":
+                epsilon.add(rule.head)
+            elif rule.kind == "internal":
+                internal.setdefault((rule.symbols[0], rule.body[0]), set()).add(rule.head)
+            else:
+                push_pop.setdefault((*rule.symbols, *rule.body), set()).add(rule.head)
+        start = {
+            variable_ids[self.variable_map[start_symbol]] for start_symbol in self.start_symbols
+            if self.variable_map.get(start_symbol) in variable_ids
+        }
+        push_symbols = {key[0] for key in push_pop}
+        pop_symbols = {key[1] for key in push_pop}
+        self._recognizer = (frozenset(epsilon), internal, push_pop, push_symbols, pop_symbols, start)
+
+    def is_accepted(self, sequence: str) -> bool:
+        """
+        Checks if the grammar derives the sequence, in a single pass with a stack and no intermediate tree.
 
+        The sequence is read right to left, keeping the set of variables that derive the suffix read so far.
+        This is the bottom-up order of the tree automaton the grammar comes from: the suffix after a pop b
+        is complete when b is read, while read left to right it would not be known yet.
+            - pop b:      the current variables are pushed with b and the inner part starts again from ε.
+            - internal c: the variables become the heads of q' → cq.
+            - push a:     the matching (b, variables) is popped and combined with the heads of q^ → apbq.
+        A symbol without rules, an unmatched pop or push, or an empty set of variables rejects the sequence.
+        """
+        if self._recognizer is None:
+            self._build_recognizer()
+        epsilon, internal, push_pop, push_symbols, pop_symbols, start = self._recognizer
+
+        current = epsilon
+        stack = []
+        for symbol in reversed(sequence):
+            if symbol in pop_symbols:
+                stack.append((symbol, current))
+                current = epsilon
+            elif symbol in push_symbols:
+                if not stack:
+                    return False
+                pop_symbol, continuations = stack.pop()
+                current = {
+                    head
+                    for p in current for q in continuations
+                    for head in push_pop.get((symbol, pop_symbol, p, q), ())
+                }
+            else:
+                current = {head for q in current for head in internal.get((symbol, q), ())}
+            if not current:
+                return False
+
+        return not stack and not current.isdisjoint(start)
+
+    def is_accepted_batch(self, sequences: list[str]) -> list[bool]:
+        return [self.is_accepted(sequence) for sequence in sequences]
 
     def print_grammar(self):
         result = f"Grammar {self.name}\n"
@@ -28,8 +130,8 @@ class VPG:
         result += f"Start Symbols: {', '.join([self.variable_map[start_symbol] for start_symbol in self.start_symbols])}\n"
         result += f"Rules:\n"
         for rule in self.rules:
-            if 'q4' not in str(rule[0]):
-                result += f"{rule[0]} -> {rule[1]}    # {rule[2]}\n"
+            if 'q4' not in self.variable_name(rule.head):
+                result += f"{self.rule_to_str(rule)}    # {rule.kind}\n"
         result += f"\n\nVariable Map:\n"
         for state, var in self.variable_map.items():
             result += f"{state} -> {var}\n"
@@ -40,43 +142,47 @@ class VPG:
 
 def vpg_from_tree_automata(tree_automata: TreeAutomata, alphabet: VPAlphabet) -> VPG:
     start_symbols = {state.name for state in tree_automata.final_states}
-    variable_map = {
-        state.name:f"q{i}" for i, state in enumerate(list(tree_automata.states))
+    # States used by the transitions but not declared (e.g. PopState in T(B_parse)) also get a variable.
+    states = list(tree_automata.states)
+    declared = set(states)
+    for transition_key, transition_state in tree_automata.transitions.items():
+        for state in (*transition_key.child_states, transition_state):
+            if state not in declared:
+                declared.add(state)
+                states.append(state)
+    state_ids = {
+        state.name: i for i, state in enumerate(states)
     }
-    variables = {variable_map[state.name] for state in tree_automata.states}
+    variable_map = {name: VPG.variable_name(i) for name, i in state_ids.items()}
+    variables = set(variable_map.values())
+
+    push_symbols = set(alphabet.get_push_symbols())
+    pop_symbols = set(alphabet.get_pop_symbols())
+    int_symbols = set(alphabet.get_int_symbols())
+
+    # Push transitions indexed by their second child (q'), so every pop transition
+    # only visits the push transitions it actually combines with.
+    push_transitions = {}
+    for transition_key, transition_state in tree_automata.transitions.items():
+        if transition_key.symbol.value in push_symbols:
+            assert len(transition_key.child_states) == 2, "Push symbols should have exactly two child states."
+            push_transitions.setdefault(transition_key.child_states[1], []).append((
+                transition_key.symbol.value,
+                state_ids[transition_key.child_states[0].name],
+                state_ids[transition_state.name]
+            ))
 
     rules = []
-    # Create epsilon rules
     for transition_key, transition_state in tree_automata.transitions.items():
         # q → ε for all q ∈ δ(ε());
         if transition_key.is_epsilon():
-            rules.append(
-                _process_epsilon_rule(
-                    transition_key,
-                    transition_state,
-                    variable_map
-                )
-            )
+            rules.append(_process_epsilon_rule(transition_state, state_ids))
         # q' → cq for all c ∈ Σint, q ∈ Q, and q' ∈ δ(c(q));
-        elif transition_key.symbol.value in alphabet.get_int_symbols():
-            rules.append(
-                _process_internal_rule(
-                    transition_key,
-                    transition_state,
-                    variable_map
-                )
-            )
+        elif transition_key.symbol.value in int_symbols:
+            rules.append(_process_internal_rule(transition_key, transition_state, state_ids))
         # q^ → apbq for all a ∈ Σpush, b ∈ Σpop, and p, q, q', q^ ∈ Q such that q' ∈ δ(b(q)) and q^ ∈ δ(a(p, q')).
-        elif transition_key.symbol.value in alphabet.get_pop_symbols():
-            rules.extend(
-                _process_push_pop_rules(
-                    transition_key,
-                    transition_state,
-                    variable_map,
-                    tree_automata,
-                    alphabet
-                )
-            )
+        elif transition_key.symbol.value in pop_symbols:
+            rules.extend(_process_push_pop_rules(transition_key, transition_state, state_ids, push_transitions))
     return VPG(
             variables=variables, 
             variable_map=variable_map,
@@ -86,75 +192,53 @@ def vpg_from_tree_automata(tree_automata: TreeAutomata, alphabet: VPAlphabet) ->
 
 
 def _process_epsilon_rule(
-    transition_key: TreeAutomataTransitionKey,
     transition_state: TreeAutomataState,
-    variable_map: dict[str, str]
-):
+    state_ids: dict[str, int]
+) -> VPGRule:
     """
     Epsilon rule definition:
     q → ε for all q ∈ δ(ε());
     """
-    return (
-        variable_map[transition_state.name],
-        transition_key.symbol,
-        "epsilon"
-    )
+    return VPGRule("epsilon", state_ids[transition_state.name], (), ())
 
 def _process_internal_rule(
     transition_key: TreeAutomataTransitionKey,
     transition_state: TreeAutomataState,
-    variable_map: dict[str, str]
-) -> tuple[str, str, str]:
+    state_ids: dict[str, int]
+) -> VPGRule:
     """
     Internal rule definition:
     q' → cq for all c ∈ Σint, q ∈ Q, and q' ∈ δ(c(q));
     """
     assert len(transition_key.child_states) == 1, "Int symbols should have exactly one child state."
-    return (
-        variable_map[transition_state.name],
-        f"{transition_key.symbol} {variable_map[transition_key.child_states[0].name]}",
-        "internal"
+    return VPGRule(
+        "internal",
+        state_ids[transition_state.name],
+        (transition_key.symbol.value,),
+        (state_ids[transition_key.child_states[0].name],)
     )
 
 def _process_push_pop_rules(
     transition_key: TreeAutomataTransitionKey,
     transition_state: TreeAutomataState,
-    variable_map: dict[str, str],
-    tree_automata: TreeAutomata,
-    alphabet: VPAlphabet
-):
+    state_ids: dict[str, int],
+    push_transitions: dict[TreeAutomataState, list[tuple[str, int, int]]]
+) -> list[VPGRule]:
     """
     Push Pop rule definition:
     - q^ → apbq for all a ∈ Σpush, b ∈ Σpop, and p, q, q', q^ ∈ Q such that q' ∈ δ(b(q)) and q^ ∈ δ(a(p, q')).
     """
     assert len(transition_key.child_states) == 1, "Pop symbols should have exactly one child state."
 
-    push_pop_rules = []
     # We found - b.  -   q' ∈ δ(b(q))
-    b = transition_key.symbol
+    b = transition_key.symbol.value
     # q is the only child of the transition
-    q = variable_map[transition_key.child_states[0].name]
+    q = state_ids[transition_key.child_states[0].name]
     # q' is the reaching state of b
     q_prime = transition_state
-    
-    # Now that we have b, let's search for an a.  -   q^ ∈ δ(a(p, q'))
-    for transition_key2, transition_state2 in tree_automata.transitions.items():
-        if transition_key2.symbol.value in alphabet.get_push_symbols():
-            assert len(transition_key2.child_states) == 2, "Push symbols should have exactly two child states."
-            # We found - a.   -   q^ ∈ δ(a(p, q'))
-            a = transition_key2.symbol
-            # q^ is the reaching state of a
-            q_hat = variable_map[transition_state2.name]
-            # p is the first child of the transition
-            p = variable_map[transition_key2.child_states[0].name]
-            # Check if q' is the second child (continuation) of a. If it is, we found a new rule
-            if q_prime == transition_key2.child_states[1]:
-                # Now we are certain that there is a new push rule
-                # Let's build it - q^ → apbq
-                push_pop_rules.append((
-                    q_hat,
-                    f"{a} {p} {b} {q}",
-                    "push-pop"
-                ))
-    return push_pop_rules
 
+    # Every a with q^ ∈ δ(a(p, q')) gives a new rule - q^ → apbq
+    return [
+        VPGRule("push-pop", q_hat, (a, b), (p, q))
+        for a, p, q_hat in push_transitions.get(q_prime, ())
+    ]
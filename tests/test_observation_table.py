@@ -0,0 +1,72 @@
+import pytest
+from base.tree import Tree, TreeSymbol
+from examples.synthetic_vpl import Dyck
+from examples.tree_automata_example import simple_tree_automaton
+from tree_automata_extraction.observation_table import ObservationTable
+from tree_automata_extraction.tl_star import TLStar
+from utils.metrics import LearningMetrics, MetricsCollector
+from vpl_extraction.vpl_star import VPLStar
+from vpl_extraction.vpl_star_random_comparator import VPLRandomComparator
+
+b = TreeSymbol('b', 0)
+
+
+class FixedComparator:
+    """
+    An equivalence oracle that always answers with the same tree.
+    """
+
+    def __init__(self, counterexample: Tree):
+        self.counterexample = counterexample
+
+    def get_counter_example(self, model, oracle):
+        return self.counterexample
+
+
+def test_extend_rejects_a_tree_that_is_not_a_counterexample():
+    table = ObservationTable(simple_tree_automaton.alphabet)
+    table.extend(Tree(b, []), simple_tree_automaton)
+    rows = dict(table.rows)
+
+    hypothesis = table.synthesize()
+    tree = Tree(b, [])
+    assert hypothesis.is_accepted(tree) == simple_tree_automaton.is_accepted(tree)
+    with pytest.raises(ValueError):
+        table.extend(tree, simple_tree_automaton)
+    assert table.rows == rows
+
+
+def test_learn_fails_on_a_spurious_counterexample_instead_of_looping():
+    learner = TLStar(simple_tree_automaton, FixedComparator(Tree(b, [])))
+    learner.observation_table.extend(Tree(b, []), simple_tree_automaton)
+    with pytest.raises(ValueError):
+        learner.learn()
+
+
+def test_resume_continues_the_round_count(tmp_path):
+    path = str(tmp_path / 'table.pkl')
+    learner = TLStar(simple_tree_automaton, checkpoint_path=path)
+    hypothesis = learner.observation_table.synthesize()
+    counterexample = learner.comparator.get_counter_example(hypothesis, simple_tree_automaton)
+    learner.observation_table.extend(counterexample, simple_tree_automaton)
+    learner.observation_table.save(path)
+
+    collector = MetricsCollector()
+    resumed = TLStar.resume(path, simple_tree_automaton, cache_policy='fifo', metrics=LearningMetrics(collector))
+    assert resumed.observation_table.cache_policy == 'fifo'
+    learned = resumed.learn()
+    assert collector.rounds[0]['round'] == 1
+    assert resumed.comparator.get_counter_example(learned, simple_tree_automaton) is None
+
+
+def test_vpl_star_resume_keeps_the_cache_settings(tmp_path):
+    path = str(tmp_path / 'table.pkl')
+    language = Dyck(2)
+    settings = dict(cache_queries=True, cache_size=64, cache_policy='fifo')
+    VPLStar(language, VPLRandomComparator(language.alphabet, seed=0), checkpoint_path=path, **settings).learn()
+
+    resumed = VPLStar.resume(path, language, VPLRandomComparator(language.alphabet, seed=0), **settings)
+    table = resumed.TLStar.observation_table
+    assert (table.cache_queries, table.cache_size, table.cache_policy) == (True, 64, 'fifo')
+    assert table.round > 0
+    assert resumed.learn() is not None
@@ -0,0 +1,21 @@
+import os
+from examples.tree_automata_example import tree_automaton
+from tree_automata.parallel_comparator import ParallelComparator
+from tree_automata.tree_comparator import TreeComparator
+from tree_automata_extraction.tl_star import TLStar
+
+
+def test_learns_with_a_single_pool_and_cleans_up_on_close():
+    with ParallelComparator(tree_automaton.alphabet, sample_size=1000, workers=2, seed=0) as comparator:
+        learned = TLStar(tree_automaton, comparator).learn()
+        executor = comparator._executor
+        directory = comparator._directory.name
+        # One pool for the whole run, and no hypothesis left behind by the finished rounds.
+        assert executor is not None
+        assert os.listdir(directory) == []
+        assert comparator.get_counter_example(learned, tree_automaton) is None
+        assert comparator._executor is executor
+
+    assert comparator._executor is None
+    assert not os.path.exists(directory)
+    assert TreeComparator(tree_automaton).get_counter_example(learned, tree_automaton) is None
@@ -0,0 +1,36 @@
+import pytest
+from base.vpl import VPL
+from examples.synthetic_vpl import RandomVPA, random_well_matched_words
+from utils.encoding import sequence_2_tree
+from vpl_extraction.vpl_star_oracle import VPLStarOracle
+
+
+class AnonymousVPL(VPL):
+    """
+    A language that does not define an identity.
+    """
+
+    def is_accepted(self, sequence: str) -> bool:
+        return True
+
+
+def test_different_languages_do_not_share_answers(tmp_path):
+    path = str(tmp_path / 'queries.db')
+    # Same seed, alphabet and tables: only the accepting states differ.
+    rejecting = RandomVPA(2, seed=7, accepting_rate=0.0)
+    accepting = RandomVPA(2, seed=7, accepting_rate=1.0)
+    words = random_well_matched_words(rejecting.alphabet, 200, 12, seed=0)
+    trees = [sequence_2_tree(word, rejecting.alphabet) for word in words]
+
+    first = VPLStarOracle(rejecting, path)
+    assert first.is_accepted_batch(trees) == rejecting.is_accepted_batch(words)
+    second = VPLStarOracle(accepting, path)
+    assert second.is_accepted_batch(trees) == accepting.is_accepted_batch(words)
+    assert second.query_store.hits == 0
+
+
+def test_query_store_needs_an_identity(tmp_path):
+    language = RandomVPA(2, seed=7)
+    with pytest.raises(ValueError):
+        VPLStarOracle(AnonymousVPL(language.alphabet), str(tmp_path / 'queries.db'))
+    assert VPLStarOracle(AnonymousVPL(language.alphabet)).query_store is None
@@ -0,0 +1,16 @@
+import pytest
+from base.tree import Tree, TreeSymbol, Context, context_node
+
+a = TreeSymbol('a', 0)
+f = TreeSymbol('f', 2)
+
+
+def test_context_checks_the_given_hole_path():
+    tree = Tree(f, [Tree(a, []), context_node])
+    assert Context(tree, (1,)).hole_path == (1,)
+    assert Context(tree).hole_path == (1,)
+    for hole_path in [(0,), (), (2,), (-1,), (1, 0)]:
+        with pytest.raises(ValueError):
+            Context(tree, hole_path)
+    with pytest.raises(ValueError):
+        Context(Tree(a, []), ())
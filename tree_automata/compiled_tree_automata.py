@@ -0,0 +1,190 @@
+import pickle
+import numpy as np
+from base.tree import Tree, TreeSymbol
+from base.flat_tree import FlatTreeBatch, flatten_trees
+from tree_automata.tree_state import TreeAutomataState
+
+
+class CompiledTreeAutomata:
+    """
+    An integer-encoded version of a TreeAutomata.
+
+    Every state gets a dense integer id and an extra sink state (the last id) is
+    added for the missing transitions. The transitions of each symbol of rank r
+    are stored as an r-dimensional NumPy array indexed by the child states, so
+    rank-0 symbols map to a single state, rank-1 symbols to a [Q] array and
+    rank-2 symbols to a [Q, Q] array (Q includes the sink).
+
+    The arrays of all the symbols with the same rank are stacked in
+    `tables[rank]`, whose last row belongs to the unknown symbols and always
+    leads to the sink.
+    """
+
+    def __init__(self, tree_automata):
+        # Some automata (e.g. T(B_parse)) use states in their transitions that are
+        # not listed in `states`, so those are collected as well.
+        states = set(tree_automata.states)
+        for key, result_state in tree_automata.transitions.items():
+            states.add(result_state)
+            states.update(key.child_states)
+        self.states: list[TreeAutomataState] = sorted(states, key=str)
+        self.state_ids: dict[TreeAutomataState, int] = {
+            state: i for i, state in enumerate(self.states)
+        }
+        self.sink = len(self.states)
+        self.n_states = len(self.states) + 1
+
+        # Hypotheses learned by VPL* carry the VPAlphabet, so the ranked symbols
+        # may only be known through the transitions.
+        symbols = set(getattr(tree_automata.alphabet, 'alphabets', ()))
+        symbols.update(key.symbol for key in tree_automata.transitions)
+        self.symbols_by_rank: dict[int, list[TreeSymbol]] = {}
+        for symbol in sorted(symbols, key=lambda symbol: (symbol.arity, symbol.name)):
+            self.symbols_by_rank.setdefault(symbol.arity, []).append(symbol)
+        self.symbol_ids: dict[TreeSymbol, int] = {
+            symbol: i
+            for rank_symbols in self.symbols_by_rank.values()
+            for i, symbol in enumerate(rank_symbols)
+        }
+
+        self.tables: dict[int, np.ndarray] = {}
+        for rank, rank_symbols in self.symbols_by_rank.items():
+            shape = (len(rank_symbols) + 1,) + (self.n_states,) * rank
+            self.tables[rank] = np.full(shape, self.sink, dtype=np.int32)
+
+        for key, result_state in tree_automata.transitions.items():
+            index = (self.symbol_ids[key.symbol],) + tuple(self.state_ids[child] for child in key.child_states)
+            self.tables[key.symbol.arity][index] = self.state_ids[result_state]
+
+        self.accepting = np.zeros(self.n_states, dtype=bool)
+        for state in tree_automata.final_states:
+            if state in self.state_ids:
+                self.accepting[self.state_ids[state]] = True
+
+        self._build_lookups()
+
+    def _build_lookups(self):
+        # Nested lists are much faster than NumPy scalar indexing inside a Python loop.
+        self._delta = {
+            symbol: self.transition_table(symbol).tolist() for symbol in self.symbol_ids
+        }
+        self._accepting = self.accepting.tolist()
+
+    def to_bytes(self) -> bytes:
+        """
+        Serializes the compiled automaton in a compact form: the ranked symbols,
+        the transition arrays and the accepting vector. The original state
+        objects are not included.
+        """
+        return pickle.dumps({
+            'symbols': {
+                rank: [symbol.name for symbol in symbols] for rank, symbols in self.symbols_by_rank.items()
+            },
+            'tables': self.tables,
+            'accepting': self.accepting,
+        }, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'CompiledTreeAutomata':
+        """
+        Loads a compiled automaton serialized with to_bytes. Its states are only known by id.
+        """
+        parts = pickle.loads(data)
+        compiled = cls.__new__(cls)
+        compiled.accepting = parts['accepting']
+        compiled.n_states = len(compiled.accepting)
+        compiled.sink = compiled.n_states - 1
+        compiled.states = None
+        compiled.state_ids = None
+        compiled.symbols_by_rank = {
+            rank: [TreeSymbol(name, rank) for name in names] for rank, names in parts['symbols'].items()
+        }
+        compiled.symbol_ids = {
+            symbol: i
+            for rank_symbols in compiled.symbols_by_rank.values()
+            for i, symbol in enumerate(rank_symbols)
+        }
+        compiled.tables = parts['tables']
+        compiled._build_lookups()
+        return compiled
+
+    def transition_table(self, symbol: TreeSymbol) -> np.ndarray:
+        """
+        Returns the transition array of a symbol, indexed by the child states.
+        """
+        if symbol.arity not in self.tables:
+            return np.full((self.n_states,) * symbol.arity, self.sink, dtype=np.int32)
+        symbol_id = self.symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = len(self.symbols_by_rank.get(symbol.arity, []))
+        return self.tables[symbol.arity][symbol_id]
+
+    def process_tree(self, tree: Tree) -> int:
+        """
+        Runs the automaton over the tree and returns the id of the state reached at the root.
+        """
+        delta = self._delta
+        sink = self.sink
+        result = {}
+
+        pending = [tree]
+        order = []
+        while pending:
+            current_node = pending.pop()
+            order.append(current_node)
+            pending.extend(current_node.children)
+
+        for current_node in reversed(order):
+            transition = delta.get(current_node.root)
+            if transition is None:
+                result[id(current_node)] = sink
+                continue
+            for child in current_node.children:
+                transition = transition[result[id(child)]]
+            result[id(current_node)] = transition
+
+        return result[id(tree)]
+
+    def is_accepted(self, tree: Tree) -> bool:
+        return self._accepting[self.process_tree(tree)]
+
+    def process_batch(self, batch: FlatTreeBatch) -> np.ndarray:
+        """
+        Runs the automaton over every node of a flattened batch and returns the state ids.
+        All the nodes of the same height are solved together with array indexing.
+        """
+        symbol_ranks = np.array([symbol.arity for symbol in batch.symbols], dtype=np.int32)
+        symbol_rows = np.array([
+            self.symbol_ids.get(symbol, len(self.symbols_by_rank.get(symbol.arity, [])))
+            for symbol in batch.symbols
+        ], dtype=np.int32)
+        node_ranks = symbol_ranks[batch.node_symbols]
+        node_rows = symbol_rows[batch.node_symbols]
+
+        states = np.full(batch.n_nodes, self.sink, dtype=np.int32)
+        for height in range(batch.n_levels):
+            level = batch.level(height)
+            level_nodes = np.arange(level.start, level.stop)
+            level_ranks = node_ranks[level]
+            for rank in np.unique(level_ranks):
+                nodes = level_nodes[level_ranks == rank]
+                table = self.tables.get(int(rank))
+                if table is None:
+                    continue
+                child_states = tuple(states[batch.children[nodes, i]] for i in range(rank))
+                states[nodes] = table[(node_rows[nodes],) + child_states]
+        return states
+
+    def accept_batch(self, trees: list[Tree] | FlatTreeBatch) -> np.ndarray:
+        """
+        Checks the acceptance of a batch of trees, returning a boolean vector.
+        """
+        batch = trees if isinstance(trees, FlatTreeBatch) else flatten_trees(trees)
+        states = self.process_batch(batch)
+        return self.accepting[states[batch.roots]]
+
+    def get_state(self, state_id: int) -> TreeAutomataState:
+        """
+        Returns the state of an id, or None for the sink.
+        """
+        return None if state_id == self.sink else self.states[state_id]
@@ -0,0 +1,185 @@
+import os
+import random
+import tempfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Tuple
+from base.alphabet import RankedAlphabet
+from base.tree import Tree
+from tree_automata.compiled_tree_automata import CompiledTreeAutomata
+from tree_automata.tree_generator import TreeGenerator
+from tree_automata.tree_comparator import _accept_batch
+
+# Estado de cada proceso trabajador: el alfabeto y el objetivo se cargan una vez con el pool.
+# La hipótesis de cada ronda se escribe una vez en un fichero; las tareas solo llevan su ruta
+# y cada trabajador la lee la primera vez que la ve.
+_worker = {}
+
+
+def _init_worker(alphabet: RankedAlphabet, target):
+    _worker['alphabet'] = alphabet
+    _worker['target'] = target
+    _worker['hypothesis_path'] = None
+
+
+def _load_hypothesis(path: str) -> CompiledTreeAutomata:
+    if _worker['hypothesis_path'] != path:
+        with open(path, 'rb') as file:
+            _worker['hypothesis'] = CompiledTreeAutomata.from_bytes(file.read())
+        _worker['hypothesis_path'] = path
+    return _worker['hypothesis']
+
+
+def _search_chunk(hypothesis_path: str, seed: int, sample_size: int, max_depth: int,
+                  max_size: int | None) -> Tree | None:
+    """
+    The task of a worker: searches a chunk against the hypothesis of the round.
+    """
+    return _search_sample(_load_hypothesis(hypothesis_path), seed, sample_size, max_depth, max_size)
+
+
+def _search_sample(hypothesis: CompiledTreeAutomata, seed: int, sample_size: int, max_depth: int,
+                   max_size: int | None) -> Tree | None:
+    """
+    Samples a chunk of trees and returns the smallest one on which the
+    hypothesis and the target disagree, or None.
+    """
+    generator = TreeGenerator(_worker['alphabet'], seed=seed)
+    target = _worker['target']
+
+    if max_size is None and hasattr(target, 'accept_batch'):
+        batch = generator.generate_flat_trees(sample_size, max_depth)
+        disagreements = np.flatnonzero(target.accept_batch(batch) != hypothesis.accept_batch(batch))
+        counterexamples = [batch.get_tree(index) for index in disagreements]
+    else:
+        if max_size is None:
+            trees = generator.generate_trees(sample_size, max_depth)
+        else:
+            trees = list(generator.iter_trees_by_size(sample_size, 1, max_size))
+        disagreements = np.flatnonzero(_accept_batch(target, trees) != hypothesis.accept_batch(trees))
+        counterexamples = [trees[index] for index in disagreements]
+
+    return min(counterexamples, key=Tree.size, default=None)
+
+
+class ParallelComparator:
+    """
+    Random-sampling equivalence queries split across a process pool.
+
+    The sample of every query is split in chunks, each sampled in a worker with its
+    own seed. The pool is started on the first query and kept until close() (or the
+    end of a with block): the target (the oracle given to get_counter_example) is sent
+    to the workers once, when the pool starts. The hypothesis of every round is
+    serialized once to a file in a temporary directory of the pool, and the chunks only
+    carry its path. As soon as a chunk finds a counterexample the pending chunks are
+    cancelled, and the smallest counterexample among the finished chunks is returned.
+    """
+
+    def __init__(self, alphabet: RankedAlphabet, sample_size: int = 1000, max_depth: int = 5,
+                 max_size: int = None, workers: int = None, chunk_size: int = 250, seed: int = None):
+        self.alphabet = alphabet
+        self.sample_size = sample_size
+        self.max_depth = max_depth
+        self.max_size = max_size
+        self.workers = workers if workers else os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._seed_sequence = np.random.SeedSequence(seed if seed is not None else random.getrandbits(64))
+        self._executor: ProcessPoolExecutor | None = None
+        self._executor_target = None
+        self._directory: tempfile.TemporaryDirectory | None = None
+        self._round = 0
+
+    def _get_executor(self, oracle) -> ProcessPoolExecutor:
+        """
+        Returns the pool of the comparator, starting it on the first query (or if the target changed).
+        """
+        if self._executor is None or self._executor_target is not oracle:
+            self.close()
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                 initargs=(self.alphabet, oracle))
+            self._executor_target = oracle
+            self._directory = tempfile.TemporaryDirectory(prefix='parallel_comparator_')
+        return self._executor
+
+    def _write_hypothesis(self, model) -> str:
+        """
+        Serializes the hypothesis of a new round for the workers and returns its path.
+        """
+        self._round += 1
+        path = os.path.join(self._directory.name, f"hypothesis_{self._round}.bin")
+        with open(path, 'wb') as file:
+            file.write(model.compile().to_bytes())
+        return path
+
+    def close(self):
+        """
+        Shuts the process pool down and removes its hypotheses. A later query starts a new one.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+            self._executor_target = None
+        if self._directory is not None:
+            self._directory.cleanup()
+            self._directory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def equivalence_query(self, model, oracle) -> Tuple[bool, Tree]:
+        counterexample = self.get_counter_example(model, oracle)
+        return counterexample is None, counterexample
+
+    def get_counter_example(self, model, oracle) -> Tree | None:
+        chunk_sizes = [
+            min(self.chunk_size, self.sample_size - start) for start in range(0, self.sample_size, self.chunk_size)
+        ]
+        # Fresh, independent seeds for every chunk of every query.
+        seeds = [int(child.generate_state(1)[0]) for child in self._seed_sequence.spawn(len(chunk_sizes))]
+
+        if self.workers == 1:
+            _init_worker(self.alphabet, oracle)
+            hypothesis = model.compile()
+            for seed, chunk_size in zip(seeds, chunk_sizes):
+                counterexample = _search_sample(hypothesis, seed, chunk_size, self.max_depth, self.max_size)
+                if counterexample is not None:
+                    return counterexample
+            return None
+
+        executor = self._get_executor(oracle)
+        hypothesis_path = self._write_hypothesis(model)
+        try:
+            pending = {
+                executor.submit(_search_chunk, hypothesis_path, seed, chunk_size, self.max_depth, self.max_size)
+                for seed, chunk_size in zip(seeds, chunk_sizes)
+            }
+            counterexamples = self._wait_first(pending)
+        finally:
+            # Every chunk of the round has finished or was cancelled: nobody reads the file any more.
+            os.remove(hypothesis_path)
+        return min(counterexamples, key=Tree.size, default=None)
+
+    @staticmethod
+    def _wait_first(pending: set) -> list[Tree]:
+        """
+        Waits until a chunk finds a counterexample (or every chunk ends) and returns the
+        counterexamples of the chunks that finished.
+        """
+        counterexamples = []
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            counterexamples.extend(future.result() for future in done if future.result() is not None)
+            if counterexamples:
+                # Chunks that did not start are cancelled, the running ones are awaited.
+                for future in pending:
+                    future.cancel()
+                counterexamples.extend(
+                    future.result() for future in pending
+                    if not future.cancelled() and future.result() is not None
+                )
+                break
+        return counterexamples
@@ -1,66 +1,319 @@
-from base.tree import Tree
+import heapq
+import weakref
+import itertools
+import numpy as np
+from base.tree import Tree, Context
 from base.tree import TreeSymbol
-from collections import deque
+from base.flat_tree import FlatTreeBatch
 from base.alphabet import RankedAlphabet
 from tree_automata.tree_state import TreeAutomataState, TreeAutomataTransitionKey
+from tree_automata.compiled_tree_automata import CompiledTreeAutomata
 
 class TreeAutomata:
     def __init__(self, states: set[TreeAutomataState], alphabet: RankedAlphabet,
-                 final_states: set[TreeAutomataState], 
+                 final_states: set[TreeAutomataState],
                  transitions: dict[TreeAutomataTransitionKey, TreeAutomataState]):
         self.states = states
         self.alphabet = alphabet
         self.final_states = final_states
         self.transitions = transitions
 
-    def process_tree(self, tree: Tree) -> bool:
-        queue = deque()
+    def __getstate__(self):
+        """
+        Only the definition of the automaton is pickled, the lookup caches are rebuilt.
+        """
+        return {
+            'states': self.states,
+            'alphabet': self.alphabet,
+            'final_states': self.final_states,
+            'transitions': self._transitions,
+        }
+
+    def __setstate__(self, state: dict):
+        self.__init__(state['states'], state['alphabet'], state['final_states'], state['transitions'])
+
+    @property
+    def transitions(self) -> dict[TreeAutomataTransitionKey, TreeAutomataState]:
+        return self._transitions
+
+    @transitions.setter
+    def transitions(self, transitions: dict[TreeAutomataTransitionKey, TreeAutomataState]):
+        """
+        Replaces the transition table and rebuilds the lookup index.
+        """
+        self._transitions = transitions
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        """
+        Builds the hashed transition index.
+        Transitions are indexed by (symbol, child states) and leaf transitions
+        are also kept in a table per arity-0 symbol, so every lookup is O(1).
+        """
+        self._index = {}
+        self._leaf_states = {}
+        self._compiled = None
+        self._spine_states = weakref.WeakKeyDictionary()
+        for transition_key, result_state in self._transitions.items():
+            self._index_transition(transition_key, result_state)
+
+    def _index_transition(self, transition_key: TreeAutomataTransitionKey, result_state: TreeAutomataState):
+        self._compiled = None
+        self._spine_states.clear()
+        self._index[(transition_key.symbol, transition_key.child_states)] = result_state
+        if transition_key.symbol.arity == 0:
+            self._leaf_states[transition_key.symbol] = result_state
+
+    def add_transition(self, transition_key: TreeAutomataTransitionKey, result_state: TreeAutomataState):
+        """
+        Adds (or replaces) a transition keeping the index up to date.
+        """
+        self._transitions[transition_key] = result_state
+        self._index_transition(transition_key, result_state)
+
+    def remove_transition(self, transition_key: TreeAutomataTransitionKey):
+        """
+        Removes a transition keeping the index up to date.
+        """
+        del self._transitions[transition_key]
+        self._compiled = None
+        self._spine_states.clear()
+        del self._index[(transition_key.symbol, transition_key.child_states)]
+        if transition_key.symbol.arity == 0:
+            del self._leaf_states[transition_key.symbol]
+
+    def process_tree(self, tree: Tree) -> TreeAutomataState:
+        """
+        Runs the automaton bottom-up over the tree and returns the state reached at the root.
+        Returns None if some node has no transition defined.
+        """
+        index = self._index
+        leaf_states = self._leaf_states
         result = {}
 
-        node_id = 0
-        queue.append((tree, node_id))
-        pending_children = {}
+        # Nodes are expanded in pre-order, so processing them in reverse
+        # guarantees that the children are always solved before their parent.
+        pending = [tree]
+        order = []
+        while pending:
+            current_node = pending.pop()
+            order.append(current_node)
+            if not current_node.is_leaf():
+                pending.extend(current_node.children)
 
-        while queue:
-            current_node, current_id = queue.popleft()
+        for current_node in reversed(order):
             if current_node.is_leaf():
-                result[current_id] = self.get_leaf_state(current_node)
+                result[id(current_node)] = leaf_states.get(current_node.root)
             else:
-                symbol = current_node.root
-                children = current_node.children
-                child_ids = []
-                for child in children:
-                    node_id += 1
-                    child_ids.append(node_id)
-                    queue.append((child, node_id))
-                
-                pending_children[current_id] = (symbol, child_ids)
-
-        for node_id in sorted(pending_children.keys(), reverse=True):
-            symbol, child_ids = pending_children[node_id]
-            child_states = [result[child_id] for child_id in child_ids]
-            transition = self.get_transition(symbol, child_states)
-            result[node_id] = transition
-
-        return result[0]
+                child_states = tuple(result[id(child)] for child in current_node.children)
+                result[id(current_node)] = index.get((current_node.root, child_states))
+
+        return result[id(tree)]
+
+    def process_in_context(self, state: TreeAutomataState, context: Context) -> TreeAutomataState:
+        """
+        Returns the state reached at the root of c[t], given the state reached by t.
+        The state is pushed up the spine of the context, so c[t] is never built.
+        The states of the siblings along the spine are computed once per context.
+        """
+        spine_states = self._spine_states.get(context)
+        if spine_states is None:
+            spine_states = self._spine_states[context] = tuple(
+                (
+                    symbol,
+                    tuple(self.process_tree(sibling) for sibling in left_siblings),
+                    tuple(self.process_tree(sibling) for sibling in right_siblings),
+                )
+                for symbol, left_siblings, right_siblings in context.spine
+            )
+
+        index = self._index
+        for symbol, left_states, right_states in spine_states:
+            state = index.get((symbol, left_states + (state,) + right_states))
+        return state
+
+    def is_accepted_in_context(self, tree: Tree, context: Context) -> bool:
+        """
+        Checks if c[t] is accepted without building it.
+        """
+        return self.process_in_context(self.process_tree(tree), context) in self.final_states
+
+    def compile(self) -> CompiledTreeAutomata:
+        """
+        Compiles the automaton into dense integer states and NumPy transition arrays.
+        The result is cached until the transitions change.
+        """
+        if self._compiled is None:
+            self._compiled = CompiledTreeAutomata(self)
+        return self._compiled
 
     def get_leaf_state(self, tree: Tree) -> TreeAutomataState:
-        for transition_key, result_state in self.transitions.items():
-            if transition_key.symbol == tree.root and transition_key.symbol.arity == 0:
-                return result_state
-        return None
+        return self._leaf_states.get(tree.root)
 
     def get_transition(self, symbol: TreeSymbol, child_states: list[TreeAutomataState]) -> TreeAutomataState:
-        for transition_key, result_state in self.transitions.items():
-            if transition_key.symbol == symbol and transition_key.child_states == tuple(child_states):
-                return result_state
-        return None
+        return self._index.get((symbol, tuple(child_states)))
 
     def is_accepted(self, tree: Tree) -> bool:
         final_state = self.process_tree(tree)
         return final_state in self.final_states
-    
+
+    def accept_batch(self, trees: list[Tree] | FlatTreeBatch) -> np.ndarray:
+        """
+        Checks the acceptance of many trees at once, returning a boolean vector.
+        The trees are flattened and evaluated level by level on the compiled automaton.
+        """
+        return self.compile().accept_batch(trees)
+
+    def is_accepted_batch(self, trees: list[Tree]) -> list[bool]:
+        """
+        Batch membership protocol shared with the VPL oracles.
+        """
+        return self.accept_batch(trees).tolist()
+
+    def is_equivalent(self, other: 'TreeAutomata') -> bool:
+        """
+        Checks exactly whether both automata accept the same trees.
+        """
+        return self.find_difference(other) is None
+
+    def find_difference(self, other: 'TreeAutomata') -> Tree | None:
+        """
+        Returns a tree of minimal size accepted by exactly one of the automata, or None if they are equivalent.
+
+        The reachable part of the product automaton is explored with a worklist ordered
+        by witness size (Knuth's generalization of Dijkstra to hypergraphs): every pair
+        (p, q) of reachable states is settled together with its smallest witness tree,
+        and new pairs are only built from settled ones. A missing transition leads to
+        None, which absorbs every tree containing it, so the (None, None) pair is pruned.
+        """
+        symbols = set(getattr(self.alphabet, 'alphabets', ())) | set(getattr(other.alphabet, 'alphabets', ()))
+        symbols |= {transition_key.symbol for transition_key in self._transitions}
+        symbols |= {transition_key.symbol for transition_key in other.transitions}
+        symbols_by_arity: dict[int, list[TreeSymbol]] = {}
+        for symbol in sorted(symbols, key=lambda symbol: (symbol.arity, symbol.name)):
+            symbols_by_arity.setdefault(symbol.arity, []).append(symbol)
+
+        # Cola de prioridad de (tamaño, desempate, par, testigo).
+        counter = itertools.count()
+        queue = []
+        best_size = {}
+        settled: dict[tuple, tuple[int, Tree]] = {}
+        settled_pairs = []
+
+        def push(pair, witness_size, symbol, children):
+            if pair != (None, None) and pair not in settled and witness_size < best_size.get(pair, witness_size + 1):
+                best_size[pair] = witness_size
+                heapq.heappush(queue, (witness_size, next(counter), pair, symbol, children))
+
+        for symbol in symbols_by_arity.get(0, []):
+            push((self._leaf_states.get(symbol), other._leaf_states.get(symbol)), 1, symbol, ())
+
+        while queue:
+            witness_size, _, pair, symbol, children = heapq.heappop(queue)
+            if pair in settled:
+                continue
+            witness = Tree(symbol, [settled[child][1] for child in children])
+            settled[pair] = (witness_size, witness)
+            if (pair[0] in self.final_states) != (pair[1] in other.final_states):
+                return witness
+
+            # Every tuple of settled pairs that uses the new pair, at its first occurrence in position i.
+            previous_pairs = settled_pairs
+            settled_pairs = settled_pairs + [pair]
+            for arity, arity_symbols in symbols_by_arity.items():
+                if arity == 0:
+                    continue
+                for i in range(arity):
+                    for children in itertools.product(*([previous_pairs] * i + [[pair]] + [settled_pairs] * (arity - i - 1))):
+                        left_states = tuple(child[0] for child in children)
+                        right_states = tuple(child[1] for child in children)
+                        children_size = 1 + sum(settled[child][0] for child in children)
+                        for symbol in arity_symbols:
+                            push((self._index.get((symbol, left_states)), other._index.get((symbol, right_states))),
+                                 children_size, symbol, children)
+
+        return None
+
+    def minimize(self) -> 'TreeAutomata':
+        """
+        Returns the minimal automaton equivalent to this one.
+
+        Unreachable states are dropped first. Then equivalent states are merged by
+        Moore-style partition refinement, starting from final / non-final and splitting
+        classes until two states of a class always lead to the same class when put in
+        the same position of a transition. The missing transitions go to an explicit
+        None sink, so dead states end up in its class and are removed with it.
+        """
+        # Estados alcanzables: punto fijo sobre las transiciones con todos los hijos alcanzables.
+        reachable = set()
+        transitions = []
+        pending = list(self._transitions.items())
+        changed = True
+        while changed:
+            changed = False
+            blocked = []
+            for transition_key, result_state in pending:
+                if all(child in reachable for child in transition_key.child_states):
+                    transitions.append((transition_key, result_state))
+                    if result_state not in reachable:
+                        reachable.add(result_state)
+                        changed = True
+                else:
+                    blocked.append((transition_key, result_state))
+            pending = blocked
+
+        # The occurrences of every state as a child: (transition key, position).
+        occurrences = {state: [] for state in reachable}
+        for transition_key, result_state in transitions:
+            for position, child in enumerate(transition_key.child_states):
+                occurrences[child].append((transition_key, position, result_state))
+
+        block = {state: int(state in self.final_states) for state in reachable}
+        block[None] = 0
+        n_blocks = len(set(block.values()))
+        while True:
+            signatures = {}
+            for state in reachable:
+                # Las transiciones que van al bloque del sumidero no distinguen, igual que las ausentes.
+                moves = frozenset(
+                    (transition_key.symbol,
+                     transition_key.child_states[:position] + transition_key.child_states[position + 1:],
+                     position, block[result_state])
+                    for transition_key, position, result_state in occurrences[state]
+                    if block[result_state] != block[None]
+                )
+                signatures[state] = (block[state], moves)
+            signatures[None] = (block[None], frozenset())
+
+            ids = {}
+            block = {state: ids.setdefault(signature, len(ids)) for state, signature in signatures.items()}
+            if len(ids) == n_blocks:
+                break
+            n_blocks = len(ids)
+
+        # One state per live block, named after its first member.
+        members = {}
+        for state in sorted(reachable, key=str):
+            if block[state] != block[None]:
+                members.setdefault(block[state], []).append(state)
+        new_states = {block_id: TreeAutomataState(states[0].name) for block_id, states in members.items()}
+
+        new_transitions = {}
+        for transition_key, result_state in transitions:
+            if block[result_state] == block[None] or any(block[child] == block[None] for child in transition_key.child_states):
+                continue
+            new_key = TreeAutomataTransitionKey(transition_key.symbol,
+                                                [new_states[block[child]] for child in transition_key.child_states])
+            new_transitions[new_key] = new_states[block[result_state]]
+
+        return TreeAutomata(
+            states=set(new_states.values()),
+            alphabet=self.alphabet,
+            final_states={new_states[block[state]] for state in reachable if state in self.final_states},
+            transitions=new_transitions
+        )
+
     def __str__(self):
         return f"TreeAutomata( \n -- states={[state.__str__() for state in self.states]} \n" \
                 + f" -- final_states={[final_state.__str__() for final_state in self.final_states]} \n" \
-                + f" -- transitions={[transition.__str__() for transition in self.transitions]} \n)"
\ No newline at end of file
+                + f" -- transitions={[transition.__str__() for transition in self.transitions]} \n)"
@@ -1,12 +1,20 @@
+import numpy as np
 from typing import Tuple
 from tree_automata.tree_generator import TreeGenerator
 from base.alphabet import RankedAlphabet
 from base.tree import Tree
+from tree_automata.tree_automata import TreeAutomata
 
 class TreeComparator:
-    def __init__(self, model, tree_generator: TreeGenerator = None, sample_size = 1000):
+    def __init__(self, model, tree_generator: TreeGenerator = None, sample_size = 1000,
+                 max_depth: int = 5, max_size: int = None, exact: bool = True):
         self.__target_model = model
+        # If both models are tree automata, equivalence is decided exactly on their product.
+        self.exact = exact
         self.sample_size = sample_size
+        self.max_depth = max_depth
+        # If max_size is set, trees are sampled uniformly by size instead of by depth.
+        self.max_size = max_size
         if tree_generator is None:
             self._tree_generator = TreeGenerator(self.__target_model.alphabet)
         else:
@@ -17,12 +25,42 @@ class TreeComparator:
         return self.__target_model.alphabet
 
     def equivalence_query(self, model) -> Tuple[bool, Tree]:
-        trees = self._tree_generator.generate_trees(self.sample_size, max_depth=5)
-        for tree in trees:
-            if self.__target_model.is_accepted(tree) != model.is_accepted(tree):
-                return False, tree
-        
+        if self.exact and isinstance(self.__target_model, TreeAutomata) and isinstance(model, TreeAutomata):
+            counterexample = self.__target_model.find_difference(model)
+            return counterexample is None, counterexample
+
+        if self.max_size is None and hasattr(self.__target_model, 'accept_batch') and hasattr(model, 'accept_batch'):
+            # Both models can evaluate flat batches, so no Tree objects are built.
+            batch = self._tree_generator.generate_flat_trees(self.sample_size, self.max_depth)
+            disagreements = np.flatnonzero(self.__target_model.accept_batch(batch) != model.accept_batch(batch))
+            if len(disagreements) > 0:
+                return False, batch.get_tree(disagreements[0])
+            return True, None
+
+        trees = self._sample_trees()
+        disagreements = np.flatnonzero(
+            _accept_batch(self.__target_model, trees) != _accept_batch(model, trees)
+        )
+        if len(disagreements) > 0:
+            return False, trees[disagreements[0]]
+
         return True, None
+
+    def _sample_trees(self) -> list[Tree]:
+        if self.max_size is None:
+            return self._tree_generator.generate_trees(self.sample_size, self.max_depth)
+        return list(self._tree_generator.iter_trees_by_size(self.sample_size, 1, self.max_size))
     
     def get_counter_example(self, model, oracle) -> Tree:
         return self.equivalence_query(model)[1]
+
+
+def _accept_batch(model, trees: list[Tree]) -> np.ndarray:
+    """
+    Checks the acceptance of a list of trees, in a single batch if the model supports it.
+    """
+    if hasattr(model, 'accept_batch'):
+        return model.accept_batch(trees)
+    if hasattr(model, 'is_accepted_batch'):
+        return np.array(model.is_accepted_batch(trees), dtype=bool)
+    return np.array([model.is_accepted(tree) for tree in trees], dtype=bool)
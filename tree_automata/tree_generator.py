@@ -1,27 +1,198 @@
 import random
+import numpy as np
+from typing import Iterator
 from base.tree import Tree
 from base.tree import TreeSymbol
 from base.alphabet import RankedAlphabet
+from base.flat_tree import FlatTreeBatch
 
 class TreeGenerator:
-    def __init__(self, ranked_alphabet: RankedAlphabet):
+    """
+    Random tree generator over a ranked alphabet.
+
+    Trees are sampled level by level for a whole batch at once, drawing the
+    symbols in bulk from a NumPy Generator. If no seed is given, the generator
+    is seeded from the `random` module so `random.seed` keeps runs reproducible.
+    """
+
+    def __init__(self, ranked_alphabet: RankedAlphabet, seed: int = None, batch_size: int = 1024):
         self.ranked_alphabet = ranked_alphabet
+        self.batch_size = batch_size
+        self.rng = np.random.default_rng(seed if seed is not None else random.getrandbits(64))
 
-    def generate_tree(self, max_depth: int) -> Tree:
-        symbols = list(self.ranked_alphabet.alphabets)
-        root_symbol = random.choice(symbols)
+        # Tablas de símbolos precalculadas por aridad.
+        self.symbols: list[TreeSymbol] = sorted(ranked_alphabet.alphabets, key=lambda symbol: (symbol.arity, symbol.name))
+        self.arities = np.array([symbol.arity for symbol in self.symbols], dtype=np.int32)
+        self.symbols_by_arity: dict[int, list[int]] = {}
+        for index, symbol in enumerate(self.symbols):
+            self.symbols_by_arity.setdefault(symbol.arity, []).append(index)
+        self.leaf_ids = np.array(self.symbols_by_arity.get(0, []), dtype=np.int32)
+        if len(self.leaf_ids) == 0:
+            raise ValueError("The alphabet must have at least one symbol of arity 0.")
 
-        if max_depth == 0 or root_symbol.arity == 0:
-            root_symbol = root_symbol if root_symbol.arity == 0  else \
-                random.choice(list(self.ranked_alphabet.get_symbols_by_arity(0)))
-            return Tree(root=root_symbol, children=[])
+        self._size_counts: list[int] = [0]
+        # There is one 0-tuple, with 0 nodes.
+        self._tuple_counts: dict[int, list[int]] = {0: [1]}
 
-        # Generar los hijos según la aridad del símbolo raíz
-        children = [
-            self.generate_tree(max_depth - 1) for _ in range(root_symbol.arity)
-        ]
+    def generate_tree(self, max_depth: int) -> Tree:
+        return next(self.iter_trees(1, max_depth))
 
-        return Tree(root=root_symbol, children=children)
-    
     def generate_trees(self, n: int, max_depth: int) -> list[Tree]:
-        return [self.generate_tree(max_depth) for _ in range(n)]
\ No newline at end of file
+        return list(self.iter_trees(n, max_depth))
+
+    def iter_trees(self, n: int, max_depth: int) -> Iterator[Tree]:
+        """
+        Lazily generates n random trees of depth at most max_depth.
+        Every node picks a symbol uniformly; nodes at max_depth pick a leaf symbol.
+        """
+        for start in range(0, n, self.batch_size):
+            node_symbols, children, roots = self._sample_levels(min(self.batch_size, n - start), max_depth)
+            yield from self._build_trees(node_symbols, children, roots)
+
+    def generate_flat_trees(self, n: int, max_depth: int) -> FlatTreeBatch:
+        """
+        Generates n random trees directly in the flat node-array format, without building Tree objects.
+        """
+        node_symbols, children, roots = self._sample_levels(n, max_depth)
+        return FlatTreeBatch.from_arrays(self.symbols, node_symbols, children, roots)
+
+    def _sample_levels(self, n: int, max_depth: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Samples n trees breadth-first, one level of the whole batch at a time.
+        Returns the node symbols, the children matrix and the roots; children always
+        have greater indices than their parents.
+        """
+        max_arity = int(self.arities.max(initial=0))
+        if n == 0:
+            return np.zeros(0, dtype=np.int32), np.zeros((0, max_arity), dtype=np.int32), np.zeros(0, dtype=np.int32)
+        levels_symbols = []
+        levels_children = []
+        offset = 0
+        count = n
+        depth = 0
+        while count > 0:
+            symbols = self.rng.integers(len(self.symbols), size=count)
+            if depth >= max_depth:
+                symbols = np.where(self.arities[symbols] == 0, symbols,
+                                   self.leaf_ids[self.rng.integers(len(self.leaf_ids), size=count)])
+            arities = self.arities[symbols]
+
+            # The children of this level are the next level, in order.
+            first_child = offset + count + np.cumsum(arities) - arities
+            positions = np.arange(max_arity)
+            level_children = np.where(positions < arities[:, None], first_child[:, None] + positions, -1)
+
+            levels_symbols.append(symbols)
+            levels_children.append(level_children)
+            offset += count
+            count = int(arities.sum())
+            depth += 1
+
+        node_symbols = np.concatenate(levels_symbols).astype(np.int32)
+        children = np.concatenate(levels_children).astype(np.int32).reshape(len(node_symbols), max_arity)
+        return node_symbols, children, np.arange(n, dtype=np.int32)
+
+    def _build_trees(self, node_symbols: np.ndarray, children: np.ndarray, roots: np.ndarray) -> list[Tree]:
+        """
+        Builds the Tree objects of nodes whose children have greater indices than their parents.
+        """
+        symbols = self.symbols
+        built = [None] * len(node_symbols)
+        node_children = children.tolist()
+        for node in range(len(node_symbols) - 1, -1, -1):
+            built[node] = Tree(symbols[node_symbols[node]],
+                               [built[child] for child in node_children[node] if child >= 0])
+        return [built[root] for root in roots]
+
+    def count_trees(self, size: int) -> int:
+        """
+        Number of distinct trees with exactly `size` nodes.
+        """
+        self._extend_counts(size)
+        return self._size_counts[size]
+
+    def iter_trees_by_size(self, n: int, min_size: int, max_size: int) -> Iterator[Tree]:
+        """
+        Lazily generates n random trees whose size is drawn uniformly between
+        min_size and max_size (among the sizes for which trees exist). Each tree is
+        drawn uniformly among all the trees of its size, so large trees are not
+        drowned by the far more likely small ones.
+        """
+        self._extend_counts(max_size)
+        sizes = [size for size in range(max(1, min_size), max_size + 1) if self._size_counts[size] > 0]
+        if not sizes:
+            raise ValueError(f"There are no trees with size between {min_size} and {max_size}.")
+
+        python_random = random.Random(int(self.rng.integers(2**63)))
+        for size in self.rng.choice(sizes, size=n):
+            yield self._sample_uniform_tree(int(size), python_random)
+
+    def _sample_uniform_tree(self, size: int, python_random: random.Random) -> Tree:
+        """
+        Exact uniform sampling of a tree with `size` nodes, using the tree counts.
+        Counts grow exponentially, so Python integers are used for the draws.
+        """
+        preorder = []
+        pending = [size]
+        while pending:
+            remaining = pending.pop()
+            # Choose the arity of the node.
+            draw = python_random.randrange(self._size_counts[remaining])
+            for arity, symbol_ids in sorted(self.symbols_by_arity.items()):
+                weight = len(symbol_ids) * self._tuples(arity)[remaining - 1]
+                if draw < weight:
+                    break
+                draw -= weight
+            preorder.append(symbol_ids[draw // self._tuples(arity)[remaining - 1]])
+
+            # Split the remaining nodes among the children.
+            child_sizes = []
+            remaining -= 1
+            for children_left in range(arity, 1, -1):
+                draw = python_random.randrange(self._tuples(children_left)[remaining])
+                for child_size in range(1, remaining + 1):
+                    weight = self._size_counts[child_size] * self._tuples(children_left - 1)[remaining - child_size]
+                    if draw < weight:
+                        break
+                    draw -= weight
+                child_sizes.append(child_size)
+                remaining -= child_size
+            if arity > 0:
+                child_sizes.append(remaining)
+            pending.extend(reversed(child_sizes))
+
+        stack = []
+        for symbol_id in reversed(preorder):
+            symbol = self.symbols[symbol_id]
+            stack.append(Tree(symbol, [stack.pop() for _ in range(symbol.arity)]))
+        return stack[0]
+
+    def _tuples(self, arity: int) -> list[int]:
+        """
+        _tuples(r)[s] is the number of r-tuples of trees with s nodes in total.
+        """
+        return self._tuple_counts[arity]
+
+    def _extend_counts(self, max_size: int):
+        """
+        Extends the tree counts up to max_size.
+        T(m) = sum over the symbols of rank r of F_r(m - 1), where F_r(s) is the
+        number of r-tuples of trees with s nodes: F_r = F_(r-1) * T (convolution).
+        """
+        max_arity = max(self.symbols_by_arity)
+        for arity in range(1, max_arity + 1):
+            self._tuple_counts.setdefault(arity, [0])
+        for size in range(len(self._size_counts), max_size + 1):
+            self._tuple_counts[0].append(0)
+            self._size_counts.append(sum(
+                len(symbol_ids) * (self._tuples(arity)[size - 1] if arity > 0 else int(size == 1))
+                for arity, symbol_ids in self.symbols_by_arity.items()
+            ))
+            for arity in range(1, max_arity + 1):
+                previous = self._tuples(arity - 1) if arity > 1 else None
+                if arity == 1:
+                    self._tuple_counts[1].append(self._size_counts[size])
+                else:
+                    self._tuple_counts[arity].append(sum(
+                        self._size_counts[k] * previous[size - k] for k in range(1, size + 1)
+                    ))
@@ -0,0 +1,129 @@
+import time
+from collections import OrderedDict
+from base.tree import Tree
+
+EVICTION_POLICIES = ('lru', 'fifo')
+
+
+class MembershipCache:
+    """
+    Memoizes the membership queries made to an oracle.
+
+    Queries are keyed by the tree itself: trees are interned, so a tree is its
+    own canonical fingerprint and structurally equal trees are only asked once.
+    When `max_size` is set the cache is bounded and entries are evicted following
+    the eviction policy:
+        - 'lru': the least recently used entry is evicted.
+        - 'fifo': the oldest inserted entry is evicted.
+    """
+
+    def __init__(self, oracle, max_size: int | None = None, policy: str = 'lru'):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy {policy}. Expected one of {EVICTION_POLICIES}.")
+        if max_size is not None and max_size < 1:
+            raise ValueError("Cache size must be greater than 0.")
+
+        self.oracle = oracle
+        self.max_size = max_size
+        self.policy = policy
+        self._entries: OrderedDict[Tree, bool] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.oracle_time = 0.0
+
+    def is_accepted(self, tree: Tree) -> bool:
+        """
+        Answers a membership query, asking the oracle only on a cache miss.
+        """
+        if tree in self._entries:
+            self.hits += 1
+            if self.policy == 'lru':
+                self._entries.move_to_end(tree)
+            return self._entries[tree]
+
+        self.misses += 1
+        start = time.perf_counter()
+        result = self.oracle.is_accepted(tree)
+        self.oracle_time += time.perf_counter() - start
+
+        self._store(tree, result)
+        return result
+
+    def is_accepted_batch(self, trees: list[Tree]) -> list[bool]:
+        """
+        Answers many membership queries, sending all the cache misses to the oracle in one batch.
+        """
+        missing = {}
+        for tree in trees:
+            if tree in self._entries:
+                self.hits += 1
+                if self.policy == 'lru':
+                    self._entries.move_to_end(tree)
+            elif tree in missing:
+                # Repeated trees inside the batch are answered by the first occurrence.
+                self.hits += 1
+            else:
+                missing[tree] = None
+        self.misses += len(missing)
+
+        answers = {}
+        if missing:
+            start = time.perf_counter()
+            if hasattr(self.oracle, 'is_accepted_batch'):
+                results = self.oracle.is_accepted_batch(list(missing))
+            else:
+                results = [self.oracle.is_accepted(tree) for tree in missing]
+            self.oracle_time += time.perf_counter() - start
+            answers = dict(zip(missing, results))
+
+        results = [answers[tree] if tree in answers else self._entries[tree] for tree in trees]
+        for tree, result in answers.items():
+            self._store(tree, result)
+        return results
+
+    def _store(self, tree: Tree, result: bool):
+        self._entries[tree] = result
+        if self.max_size is not None and len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    @property
+    def queries(self) -> int:
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.queries if self.queries else 0.0
+
+    def stats(self) -> dict:
+        """
+        Returns the cache statistics.
+        """
+        return {
+            'queries': self.queries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'oracle_time': self.oracle_time,
+        }
+
+    def clear(self):
+        """
+        Removes all the cached entries and resets the statistics.
+        """
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.oracle_time = 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __str__(self):
+        return f"MembershipCache(queries={self.queries}, hits={self.hits}, misses={self.misses}, " \
+            f"hit_rate={self.hit_rate:.2%}, oracle_time={self.oracle_time:.3f}s)"
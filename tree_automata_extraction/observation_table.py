@@ -1,17 +1,69 @@
-from base.tree import Tree, Context, context_node
+import os
+import pickle
+import numpy as np
+from base.tree import Tree, TreeSymbol, Context, context_node
+from base.flat_tree import flatten_trees
 from typing import Set, List, Dict, Tuple
 from base.alphabet import RankedAlphabet
 from tree_automata.tree_automata import TreeAutomata
 from tree_automata.tree_state import TreeAutomataState, TreeAutomataTransitionKey
+from tree_automata_extraction.membership_cache import MembershipCache
+from utils.metrics import NO_METRICS
 
 class ObservationTable:
-    def __init__(self, alphabet: RankedAlphabet):
+    def __init__(self, alphabet: RankedAlphabet, cache_queries: bool = True,
+                 cache_size: int | None = None, cache_policy: str = 'lru'):
         self.S: Set[Tree] = set()  # Árboles confirmados (estados del autómata)
         self.R: Set[Tree] = set()  # Árboles candidatos (a ser verificados)
         self.C: List[Context] = []     # Contextos observados
         self.alphabet: RankedAlphabet = alphabet # Alfabeto clasificado
-        self.observations: Dict[Tree, List[bool]] = {} # Tabla de observación
-        self.C.append(Context(context_node))
+
+        # Tabla de observación: una matriz de bits empaquetados por columnas (contextos),
+        # con una fila por árbol y un índice explícito de contexto a columna.
+        self.rows: Dict[Tree, int] = {}
+        self.context_index: Dict[Context, int] = {}
+        self._bits = np.zeros((16, 1), dtype=np.uint8)
+
+        # Índice de firmas de fila a los árboles de S que la tienen (el primero es el representante).
+        self._S_by_signature: Dict[bytes, List[Tree]] = {}
+
+        initial_context = Context(context_node)
+        self.C.append(initial_context)
+        self.context_index[initial_context] = 0
+
+        self.cache_queries = cache_queries
+        self.cache_size = cache_size
+        self.cache_policy = cache_policy
+        self.membership_cache: MembershipCache | None = None # Caché de consultas de pertenencia
+        self.metrics = NO_METRICS # Métricas del aprendizaje, las asigna el learner
+        self.round = 0 # Contraejemplos procesados, es decir, rondas completadas del learner
+
+    def is_accepted(self, tree: Tree, oracle: TreeAutomata) -> bool:
+        """
+        Asks a membership query to the oracle through the membership cache.
+        """
+        self.metrics.count('membership_queries')
+        with self.metrics.phase('membership'):
+            if not self.cache_queries:
+                return oracle.is_accepted(tree)
+            return self._get_membership_cache(oracle).is_accepted(tree)
+
+    def is_accepted_batch(self, trees: List[Tree], oracle: TreeAutomata) -> List[bool]:
+        """
+        Asks many membership queries to the oracle at once through the membership cache.
+        """
+        self.metrics.count('membership_queries', len(trees))
+        with self.metrics.phase('membership'):
+            if not self.cache_queries:
+                if hasattr(oracle, 'is_accepted_batch'):
+                    return oracle.is_accepted_batch(trees)
+                return [oracle.is_accepted(tree) for tree in trees]
+            return self._get_membership_cache(oracle).is_accepted_batch(trees)
+
+    def _get_membership_cache(self, oracle: TreeAutomata) -> MembershipCache:
+        if self.membership_cache is None or self.membership_cache.oracle is not oracle:
+            self.membership_cache = MembershipCache(oracle, self.cache_size, self.cache_policy)
+        return self.membership_cache
 
     def complete(self):
         """
@@ -23,67 +75,137 @@ class ObservationTable:
                         obs(s, c) = obs(r, c)
         """
         for r_tree in self.R:
-            not_in_S = True
-            for s_tree in self.S:
-                if self.complete_obs(s_tree) == self.complete_obs(r_tree):
-                    not_in_S = False
-                    break
-            if not_in_S:
+            if self.row_signature(r_tree) not in self._S_by_signature:
                 self.promote_to_S(r_tree)
 
-    def obs(self, tree: Tree, context: Context) -> str:
+    def obs(self, tree: Tree, context: Context) -> bool:
         """
         Returns the observation of a tree in a given context.
         """
-        context_index = self.C.index(context)
-        return self.observations.get(tree)[context_index]
+        column = self.context_index[context]
+        return bool(self._bits[self.rows[tree], column >> 3] & (0x80 >> (column & 7)))
     
-    def complete_obs(self, tree: Tree):
+    def complete_obs(self, tree: Tree) -> List[bool]:
         """
         Completes the observation of a tree.
         """
-        return self.observations.get(tree)
+        row = self._bits[self.rows[tree]]
+        return np.unpackbits(row, count=len(self.C)).astype(bool).tolist()
+
+    def row_signature(self, tree: Tree) -> bytes:
+        """
+        Returns the packed observations of a tree as a hashable byte string.
+        Two trees have the same signature iif they have the same observations.
+        """
+        return self._bits[self.rows[tree], :self._n_bytes()].tobytes()
+
+    @property
+    def observations(self) -> Dict[Tree, List[bool]]:
+        """
+        The observations of every tree of the table, unpacked.
+        """
+        return {tree: self.complete_obs(tree) for tree in self.rows}
     
-    def add_observation(self, tree: Tree, context: Context, observation: str):
+    def add_observation(self, tree: Tree, context: Context, observation: bool):
         """
         Adds an observation to the observation table.
         """
-        if tree not in self.observations:
-            self.observations[tree] = [False for _ in range(len(self.C))]
-        context_index = self.C.index(context)
-        if context_index == len(self.observations[tree]):
-            self.observations[tree].append(observation)
-        elif context_index > len(self.observations[tree]):
-            raise ValueError("Context index is out of bounds.")
+        if context not in self.context_index:
+            raise ValueError("Context is not in the observation table.")
+        in_S = tree in self.S
+        if in_S:
+            self._unindex_S_tree(tree)
+        row = self._get_row(tree)
+        column = self.context_index[context]
+        if observation:
+            self._bits[row, column >> 3] |= 0x80 >> (column & 7)
         else:
-            self.observations[tree][context_index] = observation
+            self._bits[row, column >> 3] &= ~np.uint8(0x80 >> (column & 7))
+        if in_S:
+            self._index_S_tree(tree)
+
+    def _index_S_tree(self, tree: Tree):
+        self._S_by_signature.setdefault(self.row_signature(tree), []).append(tree)
+
+    def _unindex_S_tree(self, tree: Tree):
+        signature = self.row_signature(tree)
+        trees = self._S_by_signature[signature]
+        trees.remove(tree)
+        if not trees:
+            del self._S_by_signature[signature]
+
+    def _reindex_S(self):
+        """
+        Rebuilds the signature index of S, needed when every signature changes (a new context).
+        """
+        self._S_by_signature = {}
+        for tree in self.S:
+            self._index_S_tree(tree)
+
+    def _n_bytes(self) -> int:
+        return (len(self.C) + 7) >> 3
+
+    def _get_row(self, tree: Tree) -> int:
+        """
+        Returns the row of a tree, adding an empty one if the tree is new.
+        """
+        row = self.rows.get(tree)
+        if row is None:
+            row = self.rows[tree] = len(self.rows)
+            if row == self._bits.shape[0]:
+                self._bits = np.vstack([self._bits, np.zeros_like(self._bits)])
+        return row
+
+    def _add_column(self) -> int:
+        """
+        Makes room for one more column in the bit matrix and returns its index.
+        """
+        column = len(self.C) - 1
+        if (column >> 3) == self._bits.shape[1]:
+            self._bits = np.hstack([self._bits, np.zeros_like(self._bits)])
+        return column
 
     def add_tree(self, tree: Tree, oracle: TreeAutomata):
         """
         Adds a tree to the observation table.
         """
         self.R.add(tree)
-        for context in self.C:
-            applied_context = tree.apply_context(context)
-            # print("Adding observation for tree", tree, "with context", context)
-            # print("Applied context", applied_context)
-            # print("Is accepted?", oracle.is_accepted(applied_context))
-            self.add_observation(tree, context, oracle.is_accepted(applied_context))
+        applied_contexts = [tree.apply_context(context) for context in self.C]
+        observations = self.is_accepted_batch(applied_contexts, oracle)
+        in_S = tree in self.S
+        if in_S:
+            self._unindex_S_tree(tree)
+        row = self._get_row(tree)
+        packed = np.packbits(np.array(observations, dtype=bool))
+        self._bits[row, :len(packed)] = packed
+        if in_S:
+            self._index_S_tree(tree)
 
     def promote_to_S(self, tree: Tree):
         """
         Promotes a tree from R to S.
         """
+        if tree in self.S:
+            return
         self.S.add(tree)
+        self._index_S_tree(tree)
 
     def add_context(self, context: Context, oracle: TreeAutomata):
         """
         Adds a context to the observation table.
         """
+        if context in self.context_index:
+            return
         self.C.append(context)
-        for tree in self.R:
-            applied_context = tree.apply_context(context)
-            self.add_observation(tree, context, oracle.is_accepted(applied_context))
+        column = self.context_index[context] = self._add_column()
+
+        # The whole column is filled with a single batched oracle call.
+        trees = list(self.R)
+        applied_contexts = [tree.apply_context(context) for tree in trees]
+        observations = np.array(self.is_accepted_batch(applied_contexts, oracle), dtype=bool)
+        rows = np.array([self._get_row(tree) for tree in trees], dtype=np.int64)
+        self._bits[rows[observations], column >> 3] |= np.uint8(0x80 >> (column & 7))
+        self._reindex_S()
 
     def synthesize(self) -> TreeAutomata:
         """
@@ -95,14 +217,13 @@ class ObservationTable:
         state_dict = {}
         for tree in self.S:
             state = TreeAutomataState(str(tree))
-            state_dict[tuple(self.observations.get(tree))] = state
+            state_dict[self.row_signature(tree)] = state
             states.add(state)
             if self.obs(tree, Context(context_node)):
                 final_states.add(state)
 
         for tree in self.R:
-            tree_observations = self.observations.get(tree)
-            next_state = state_dict[tuple(tree_observations)]
+            next_state = state_dict[self.row_signature(tree)]
             transition_symbol = tree.get_root_symbol()
             transition_child_states = self._find_states(tree.children, state_dict)
             key = TreeAutomataTransitionKey(transition_symbol, transition_child_states)
@@ -110,86 +231,192 @@ class ObservationTable:
             
         return TreeAutomata(states, self.alphabet, final_states, transitions)
     
-    def _find_states(self, trees: List[Tree], state_dict: Dict[List[bool], TreeAutomataState]):
+    def _find_states(self, trees: List[Tree], state_dict: Dict[bytes, TreeAutomataState]):
         """
         Finds the states of the children of a tree.
         """
         states = []
         for tree in trees:
-            tree_observations = self.observations.get(tree)
-            states.append(state_dict[tuple(tree_observations)])
+            states.append(state_dict[self.row_signature(tree)])
         return states
     
     def _find_equivalent_in_S(self, tree: Tree):
         """
         Finds an equivalent tree in S.
         """
-        for s_tree in self.S:
-            if self.complete_obs(s_tree) == self.complete_obs(tree):
-                return s_tree
-        return None
+        equivalent_trees = self._S_by_signature.get(self.row_signature(tree))
+        return equivalent_trees[0] if equivalent_trees else None
     
     def extend(self, counterexample: Tree, oracle: TreeAutomata):
         """
         Extends the observation table with a counterexample.
+        The counterexample is decomposed as c[s]: if s is not in R it is added to R,
+        otherwise c is a new context that separates s from its representative in S.
+        Raises ValueError if the tree is not a counterexample: the table would not change
+        and the learner would ask the same equivalence query forever.
         """
-        cs = self._decompose(counterexample, Context(context_node))
+        with self.metrics.phase('_decompose'):
+            cs = self._decompose(counterexample, oracle)
         if cs is None:
-            raise ValueError(f"Counterexample {counterexample} is not decomposable.")
+            raise ValueError(f"Counterexample {counterexample} is not decomposable: "
+                             f"the hypothesis already classifies it as the oracle does.")
 
         c, s = cs
-        if s in self.R:
-            s_prime = self._find_equivalent_in_S(s)
-            if s_prime is None:
-                raise ValueError(f"Equivalent tree for {s} not found in S.")
-            cs_prime = s_prime.apply_context(c)
-            # print("Tree", s_prime, "with context", c, "is equivalent to", cs_prime)
-            if oracle.is_accepted(cs_prime) == oracle.is_accepted(counterexample):
-                # print("Counterexample is consistent.")
-                self.extend(cs_prime, oracle)
-            else:
+        if c is None:
+            # print("Tree not in R!!")
+            with self.metrics.phase('add_tree'):
                 self.add_tree(s, oracle)
-                self.promote_to_S(s)
-                self.add_context(c, oracle)
-                self.complete()
         else:
-            # print("Tree not in R!!")
-            self.add_tree(s, oracle)
+            with self.metrics.phase('add_context'):
+                self.add_context(c, oracle)
+        with self.metrics.phase('complete'):
             self.complete()
+        self.round += 1
 
-    def _decompose(self, tree: Tree, context: Context) -> Tuple[Context, Tree] | None:
+    def _decompose(self, counterexample: Tree, oracle: TreeAutomata) -> Tuple[Context | None, Tree] | None:
         """
-        Decomposes a tree into c and s.
+        Decomposes a counterexample into c and s, in the style of Rivest-Schapire.
+
+        The counterexample is walked once bottom-up, replacing every node by the
+        representative in S of its hypothesis state. If some node has no transition
+        (its tree s is not in R) the decomposition is (None, s).
+
+        Otherwise, t_i is the counterexample with its first i nodes (in post-order)
+        replaced: t_0 is the counterexample and t_k is the representative of the root,
+        whose observation is the answer of the hypothesis. A binary search finds an i
+        such that t_i and t_(i+1) get different answers from the oracle, which needs
+        O(log k) queries. They only differ in the (i+1)-th node, so the decomposition
+        is the context around that node and the tree s it has in t_i.
         """
+        nodes, children_positions = self._post_order(counterexample)
+
+        representatives = []
+        for node, child_positions in zip(nodes, children_positions):
+            s = Tree(node.root, [representatives[position] for position in child_positions])
+            if s not in self.R:
+                return None, s
+            s_prime = self._find_equivalent_in_S(s)
+            if s_prime is None:
+                raise ValueError(f"Equivalent tree for {s} not found in S.")
+            representatives.append(s_prime)
+
+        def replace_prefix(i: int, hole: int = None) -> Tree:
+            built = []
+            for j, (node, child_positions) in enumerate(zip(nodes, children_positions)):
+                if j < i:
+                    built.append(representatives[j])
+                elif j == hole:
+                    built.append(context_node)
+                else:
+                    built.append(Tree(node.root, [built[position] for position in child_positions]))
+            return built[-1]
 
-        if tree in self.S and tree.is_leaf():
+        counterexample_result = self.is_accepted(counterexample, oracle)
+        if counterexample_result == self.obs(representatives[-1], self.C[0]):
             return None
 
-        if tree not in self.S:
-            childs_in_S = True
-            for child in tree.children:
-                childs_in_S = childs_in_S and (child in self.S)
-            
-            if childs_in_S:
-                return context, tree
-        
-        for i in range(len(tree.children)):
-            child = tree.children[i]
-            context_part = Context(
-                            Tree(
-                                tree.root,
-                                [tree.children[j] if j != i else context_node for j in range(len(tree.children))]
-                                )
-                            )
-            
-            next_context = context_part.root.apply_context(context)
-            
-            cs = self._decompose(child, Context(next_context))
-            if cs is not None:
-                return cs
-            
-        return None
-            
+        low, high = 0, len(nodes)
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self.is_accepted(replace_prefix(middle), oracle) == counterexample_result:
+                low = middle
+            else:
+                high = middle
+
+        c = Context(replace_prefix(low, hole=low))
+        s = Tree(nodes[low].root, [representatives[position] for position in children_positions[low]])
+        return c, s
+
+    @staticmethod
+    def _post_order(tree: Tree) -> Tuple[List[Tree], List[List[int]]]:
+        """
+        Lists the nodes of a tree in post-order, with the positions of the children of every node.
+        """
+        nodes = []
+        children_positions = []
+        positions = []
+        pending = [(tree, False)]
+        while pending:
+            node, expanded = pending.pop()
+            if not expanded:
+                pending.append((node, True))
+                for child in reversed(node.children):
+                    pending.append((child, False))
+                continue
+            arity = len(node.children)
+            child_positions = positions[len(positions) - arity:]
+            del positions[len(positions) - arity:]
+            positions.append(len(nodes))
+            nodes.append(node)
+            children_positions.append(child_positions)
+        return nodes, children_positions
+
+    def save(self, path: str):
+        """
+        Saves a snapshot of the table: S, R, C, the observations and the round.
+
+        Every tree of the table (rows and contexts) goes into a single node table where
+        shared subtrees are stored once, the contexts are kept as a root and a hole path,
+        and the bit matrix is saved as it is. The file is written next to its final path
+        and then renamed, so a crash never leaves a half-written snapshot behind.
+        """
+        row_trees = sorted(self.rows, key=self.rows.__getitem__)
+        batch = flatten_trees(row_trees + [context.root for context in self.C])
+        snapshot = {
+            'version': 1,
+            'alphabet': self.alphabet,
+            'symbols': [(symbol.name, symbol.arity) for symbol in batch.symbols],
+            'node_symbols': batch.node_symbols,
+            'children': batch.children,
+            'roots': batch.roots,
+            'hole_paths': [context.hole_path for context in self.C],
+            'S': np.array([self.rows[tree] for tree in self.S], dtype=np.int32),
+            'R': np.array([self.rows[tree] for tree in self.R], dtype=np.int32),
+            'bits': self._bits[:len(row_trees), :self._n_bytes()].copy(),
+            'round': self.round,
+        }
+
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, 'wb') as file:
+            pickle.dump(snapshot, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path: str, cache_queries: bool = True, cache_size: int | None = None,
+             cache_policy: str = 'lru') -> 'ObservationTable':
+        """
+        Loads a table saved with save. The membership cache starts empty.
+        """
+        with open(path, 'rb') as file:
+            snapshot = pickle.load(file)
+        if snapshot.get('version') != 1:
+            raise ValueError(f"Unsupported observation table snapshot: {path}")
+
+        # Los nodos están ordenados por altura: los hijos siempre se construyen antes que el padre.
+        symbols = [TreeSymbol(name, arity) for name, arity in snapshot['symbols']]
+        nodes = []
+        for symbol_id, children in zip(snapshot['node_symbols'].tolist(), snapshot['children'].tolist()):
+            nodes.append(Tree(symbols[symbol_id], [nodes[child] for child in children if child >= 0]))
+
+        hole_paths = snapshot['hole_paths']
+        roots = [nodes[root] for root in snapshot['roots'].tolist()]
+        row_trees = roots[:len(roots) - len(hole_paths)]
+        context_roots = roots[len(row_trees):]
+
+        table = cls(snapshot['alphabet'], cache_queries, cache_size, cache_policy)
+        table.C = [Context(root, tuple(hole_path)) for root, hole_path in zip(context_roots, hole_paths)]
+        table.context_index = {context: column for column, context in enumerate(table.C)}
+        table.rows = {tree: row for row, tree in enumerate(row_trees)}
+
+        bits = snapshot['bits']
+        table._bits = np.zeros((max(16, len(row_trees)), max(1, bits.shape[1])), dtype=np.uint8)
+        table._bits[:bits.shape[0], :bits.shape[1]] = bits
+
+        table.R = {row_trees[row] for row in snapshot['R'].tolist()}
+        table.S = {row_trees[row] for row in snapshot['S'].tolist()}
+        table._reindex_S()
+        table.round = snapshot.get('round', 0)
+        return table
 
     def __str__(self):
         """
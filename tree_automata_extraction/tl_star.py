@@ -1,21 +1,92 @@
 from tree_automata_extraction.observation_table import ObservationTable
 from tree_automata.tree_automata import TreeAutomata
 from tree_automata.tree_comparator import TreeComparator
+from utils.metrics import LearningMetrics, NO_METRICS
 
 class TLStar:
-    def __init__(self, oracle, eq = None):
-        self.observation_table = ObservationTable(oracle.alphabet)
+    def __init__(self, oracle, eq = None, cache_queries: bool = True, cache_size: int | None = None,
+                 cache_policy: str = 'lru', checkpoint_path: str | None = None,
+                 metrics: LearningMetrics | None = None, observation_table: ObservationTable | None = None):
+        # A given table (e.g. loaded from a checkpoint) is used as it is, with its own cache settings.
+        resumed = observation_table is not None
+        if not resumed:
+            observation_table = ObservationTable(oracle.alphabet, cache_queries, cache_size, cache_policy)
+        self.observation_table = observation_table
         self.oracle = oracle
         self.comparator = eq if eq else TreeComparator(oracle)
+        # Snapshot of the observation table, rewritten after every round.
+        self.checkpoint_path = checkpoint_path
+        # Métricas por ronda; sin métricas, cada llamada es una operación vacía.
+        self.metrics = metrics if metrics is not None else NO_METRICS
+        self.observation_table.metrics = self.metrics
+        if resumed and self.metrics.enabled:
+            # Las rondas siguen contando desde las que ya procesó la tabla.
+            self.metrics.round = observation_table.round
+        self._oracle_stats = (None, 0, 0.0)
+
+    @classmethod
+    def resume(cls, path: str, oracle, eq = None, cache_queries: bool = True, cache_size: int | None = None,
+               cache_policy: str = 'lru', metrics: LearningMetrics | None = None) -> 'TLStar':
+        """
+        Builds a learner from the snapshot saved in path, so learn continues from the last
+        completed round. The learner keeps checkpointing to the same path, and the rounds
+        of the metrics go on from the saved one.
+        """
+        observation_table = ObservationTable.load(path, cache_queries, cache_size, cache_policy)
+        return cls(oracle, eq, checkpoint_path=path, metrics=metrics, observation_table=observation_table)
 
     def learn(self):
         """
         Learns a tree automata from the observation table.
         """
+        metrics = self.metrics
+        metrics.start(checkpoint_path=self.checkpoint_path)
         while True:
-            automata = self.observation_table.synthesize()
-            counterexample = self.comparator.get_counter_example(automata, self.oracle)
+            with metrics.phase('synthesize'):
+                automata = self.observation_table.synthesize()
+            metrics.count('equivalence_queries')
+            with metrics.phase('get_counter_example'):
+                counterexample = self.comparator.get_counter_example(automata, self.oracle)
             if counterexample is None:
+                self._end_round(automata, counterexample)
                 return automata
             else:
-                self.observation_table.extend(counterexample, self.oracle)
+                with metrics.phase('extend'):
+                    self.observation_table.extend(counterexample, self.oracle)
+                if self.checkpoint_path is not None:
+                    with metrics.phase('checkpoint'):
+                        self.observation_table.save(self.checkpoint_path)
+                self._end_round(automata, counterexample)
+
+    def _end_round(self, automata: TreeAutomata, counterexample):
+        """
+        Closes the round of the metrics with the size of the table and of the hypothesis.
+        """
+        metrics = self.metrics
+        if not metrics.enabled:
+            return
+
+        # Las consultas que llegaron al oráculo son los fallos de la caché de esta ronda.
+        cache = self.membership_cache
+        if cache is not None:
+            previous_cache, previous_misses, previous_time = self._oracle_stats
+            if previous_cache is not cache:
+                previous_misses, previous_time = 0, 0.0
+            metrics.count('oracle_queries', cache.misses - previous_misses)
+            metrics.add_time('oracle', cache.oracle_time - previous_time)
+            self._oracle_stats = (cache, cache.misses, cache.oracle_time)
+
+        table = self.observation_table
+        metrics.end_round(
+            S=len(table.S), R=len(table.R), C=len(table.C),
+            hypothesis_states=len(automata.states),
+            hypothesis_transitions=len(automata.transitions),
+            counterexample_size=counterexample.size() if counterexample is not None else None,
+        )
+
+    @property
+    def membership_cache(self):
+        """
+        The membership cache of the observation table, None if no query was made yet.
+        """
+        return self.observation_table.membership_cache
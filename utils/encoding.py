@@ -1,6 +1,8 @@
-from base.alphabet import VPAlphabet, RankedAlphabet
+import weakref
+import numpy as np
+from base.alphabet import VPAlphabet, RankedAlphabet, INTERNAL, PUSH, POP
 from base.tree import TreeSymbol, Tree, empty_symbol, epsilon, empty_tree
-
+from base.flat_tree import FlatTreeBatch
 
 def vpalphabet_2_ranked(vpalphabet: VPAlphabet) -> RankedAlphabet:
     """
@@ -15,29 +17,160 @@ def vpalphabet_2_ranked(vpalphabet: VPAlphabet) -> RankedAlphabet:
     return RankedAlphabet(all_symbols, vpalphabet.name)
 
 
-def tree_2_sequence(tree: Tree, alphabet: VPAlphabet) -> str:
+class VPCodec:
     """
-    Convert a well-formed tree to a sequence of symbols.
-    The tree must be well-formed, meaning that it should belong to T(B_parse).
+    Converts between sequences of a VPAlphabet and their trees:
+        - push a:     a x b y  <->  a(x, b(y))
+        - internal c: c x      <->  c(x)
+        - ε           <->  ε
+    The class of every character and its ranked TreeSymbol are looked up once,
+    when the codec is built, and shared by all the conversions.
     """
 
-    pending = [tree]
-    sequence = []
-    while pending:
-        current = pending.pop()
-        if not current.is_leaf():
+    def __init__(self, alphabet: VPAlphabet):
+        self.alphabet = alphabet
+        self.kinds: dict[str, int] = alphabet.kinds
+        self.tree_symbols: dict[str, TreeSymbol] = {
+            symbol: TreeSymbol(symbol, 2 if kind == PUSH else 1) for symbol, kind in alphabet.kinds.items()
+        }
+
+        # Tabla de símbolos del formato plano: ε es siempre el símbolo 0.
+        self.symbols: list[TreeSymbol] = [empty_symbol] + sorted(
+            self.tree_symbols.values(), key=lambda symbol: (symbol.arity, symbol.name)
+        )
+        self.symbol_ids: dict[str, int] = {
+            symbol.name: i for i, symbol in enumerate(self.symbols) if symbol is not empty_symbol
+        }
+
+    def encode(self, tree: Tree) -> str:
+        """
+        Linearizes a well-formed tree (one that belongs to T(B_parse)) in a single pre-order walk.
+        """
+        tree_symbols = self.tree_symbols
+        pending = [tree]
+        sequence = []
+        while pending:
+            current = pending.pop()
+            if current.root.arity == 0:
+                continue
             symbol = current.root.name
-            if symbol not in alphabet.get_all_symbols():
+            expected = tree_symbols.get(symbol)
+            if expected is None:
                 raise ValueError(f"Symbol {symbol} is not in the alphabet.")
-            if symbol in alphabet.get_push_symbols() and current.root.arity != 2:
-                raise ValueError(f"Symbol {symbol} is not a push symbol.")
-            if (symbol in alphabet.get_pop_symbols() or symbol in alphabet.get_int_symbols()) and current.root.arity != 1:
-                raise ValueError(f"Symbol {symbol} is not a pop or internal symbol.")
-            sequence.append(current.root.name)
-            for child in reversed(current.children):
-                pending.append(child)
-    
-    return ''.join(sequence)
+            if expected.arity != current.root.arity:
+                raise ValueError(f"Symbol {symbol} has arity {current.root.arity}, expected {expected.arity}.")
+            sequence.append(symbol)
+            pending.extend(reversed(current.children))
+        return ''.join(sequence)
+
+    def decode(self, sequence: str) -> Tree:
+        """
+        Builds the tree of a well-formed sequence in a single right-to-left pass.
+        The tree of the suffix read so far is kept, and every pop b saves it as b(y)
+        on a stack until its matching push a builds a(x, b(y)).
+        """
+        if sequence is None:
+            raise ValueError(f"Sequence cannot be None.")
+        if sequence == epsilon:
+            return empty_tree
+
+        kinds = self.kinds
+        tree_symbols = self.tree_symbols
+        current = empty_tree
+        stack = []
+        for symbol in reversed(sequence):
+            kind = kinds.get(symbol)
+            if kind == POP:
+                stack.append(Tree(tree_symbols[symbol], (current,)))
+                current = empty_tree
+            elif kind == INTERNAL:
+                current = Tree(tree_symbols[symbol], (current,))
+            elif kind == PUSH:
+                if not stack:
+                    raise ValueError(f"Sequence is not well-formed. Push symbol {symbol} without a pop symbol.")
+                current = Tree(tree_symbols[symbol], (current, stack.pop()))
+            else:
+                raise ValueError(f"Symbol {symbol} is not in the alphabet.")
+
+        if stack:
+            raise ValueError("Sequence is not well-formed. Pop symbol without a push symbol.")
+        return current
+
+    def sequences_to_flat(self, sequences: list[str]) -> tuple[FlatTreeBatch, np.ndarray]:
+        """
+        Converts many sequences straight into a FlatTreeBatch, without building Tree objects.
+        Returns the batch with the trees of the well-formed sequences, in order, and the
+        boolean mask of which sequences were well-formed. All the ε leaves share one node.
+        """
+        kinds = self.kinds
+        symbol_ids = self.symbol_ids
+        node_symbols = [0]
+        first_children = [-1]
+        second_children = [-1]
+        heights = [0]
+        roots = []
+        well_formed = np.zeros(len(sequences), dtype=bool)
+
+        for index, sequence in enumerate(sequences):
+            start = len(node_symbols)
+            current = 0
+            stack = []
+            valid = sequence is not None
+            for symbol in reversed(sequence if valid and sequence != epsilon else ''):
+                kind = kinds.get(symbol)
+                if kind == POP:
+                    stack.append(len(node_symbols))
+                    first_children.append(current)
+                    second_children.append(-1)
+                    heights.append(heights[current] + 1)
+                    current = 0
+                elif kind == INTERNAL:
+                    first_children.append(current)
+                    second_children.append(-1)
+                    heights.append(heights[current] + 1)
+                    current = len(node_symbols)
+                elif kind == PUSH and stack:
+                    pop_node = stack.pop()
+                    first_children.append(current)
+                    second_children.append(pop_node)
+                    heights.append(max(heights[current], heights[pop_node]) + 1)
+                    current = len(node_symbols)
+                else:
+                    valid = False
+                    break
+                node_symbols.append(symbol_ids[symbol])
+
+            if valid and not stack:
+                well_formed[index] = True
+                roots.append(current)
+            else:
+                # Se descartan los nodos de la secuencia mal formada.
+                del node_symbols[start:], first_children[start:], second_children[start:], heights[start:]
+
+        children = np.array([first_children, second_children], dtype=np.int32).T
+        batch = FlatTreeBatch.from_arrays(self.symbols, node_symbols, children, roots, heights)
+        return batch, well_formed
+
+
+_codecs: 'weakref.WeakKeyDictionary[VPAlphabet, VPCodec]' = weakref.WeakKeyDictionary()
+
+
+def get_codec(alphabet: VPAlphabet) -> VPCodec:
+    """
+    Returns the codec of an alphabet, built once and cached while the alphabet is alive.
+    """
+    codec = _codecs.get(alphabet)
+    if codec is None:
+        codec = _codecs[alphabet] = VPCodec(alphabet)
+    return codec
+
+
+def tree_2_sequence(tree: Tree, alphabet: VPAlphabet) -> str:
+    """
+    Convert a well-formed tree to a sequence of symbols.
+    The tree must be well-formed, meaning that it should belong to T(B_parse).
+    """
+    return get_codec(alphabet).encode(tree)
 
 
 def sequence_2_tree(sequence: str, alphabet: VPAlphabet) -> Tree:
@@ -47,73 +180,4 @@ def sequence_2_tree(sequence: str, alphabet: VPAlphabet) -> Tree:
 
     If the sequnce is not well-formed or has symbols that are not in the alphabet, it raises a ValueError.
     """
-
-    if sequence is None:
-        raise ValueError(f"Sequence cannot be None.")
-
-    if len(sequence) == 0 or sequence == epsilon:
-        return Tree(TreeSymbol(empty_symbol, 0), [])
-
-    stack: list[Tree] = []
-    for i in range(len(sequence)-1, -1, -1):
-        symbol = sequence[i]
-
-        # If the symbol is not in the alphabet, raise an error.
-        if symbol not in alphabet.get_all_symbols():
-            raise ValueError(f"Symbol {symbol} is not in the alphabet.")
-        
-        
-        # If the stack is empty and the symbol is push the sequence is not well-formed
-        # If not we just add the correspondig tree to the stack.
-        if not stack:
-            if symbol in alphabet.get_push_symbols():
-                raise ValueError(f"Sequence is not well-formed. Push symbol {symbol} without a pop symbol.")
-            else:
-                stack.append(Tree(TreeSymbol(symbol, 1), [empty_tree]))
-            continue
-
-        if symbol in alphabet.get_push_symbols():
-            last_to_process = stack.pop()
-            if last_to_process.root.value in alphabet.get_pop_symbols():
-                # If the last processed symbol is a pop symbol, 
-                # it means there is no symbol between the push and pop.
-                left_child = empty_tree
-            else:
-                # If the last processed symbol is not a pop symbol, 
-                # it means there is a subtree that should be the left chile of the new push symbol.
-                left_child = stack.pop()
-            new_sub_tree = Tree(TreeSymbol(symbol, 2), [last_to_process, left_child])
-            stack.append(new_sub_tree)
-
-        elif symbol in alphabet.get_pop_symbols():
-            last_to_process = stack.pop()
-            if last_to_process.root.value in alphabet.get_pop_symbols():
-                # If the last processed symbol is a pop symbol then it can't be the child of other pop symbol.
-                # We add the last pop symbol and the new one with an ampty tree as child.
-                stack.append(last_to_process)
-                child = empty_tree
-            else:
-                # If the last processed symbol is not a pop symbol,
-                # it means it is a child of the pop tree.
-                child = last_to_process
-            stack.append(Tree(TreeSymbol(symbol, 1), [child]))
-
-        elif symbol in alphabet.get_int_symbols():
-            last_to_process = stack.pop()
-            if last_to_process.root.value in alphabet.get_pop_symbols():
-                # If it's a pop symbol, then it can't be a child of an internal symbol.
-                # We add the pop tree and set the child of the internal tree to empty tree.
-                stack.append(last_to_process)
-                child = empty_tree
-            else:
-                # If it's not a pop symbol, then it is a child of the internal tree.
-                # We set the child of the internal tree to the last processed tree.
-                child = last_to_process
-            stack.append(Tree(TreeSymbol(symbol, 1), [child]))
-
-    # After processing all symbols, there should be exactly one tree in the stack.
-    # If there are more than one, it means the sequence is not well-formed.
-    if len(stack) != 1:
-        raise ValueError("Sequence does not form a well-formed tree.")
-
-    return stack[0]
+    return get_codec(alphabet).decode(sequence)
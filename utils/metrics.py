@@ -0,0 +1,162 @@
+import json
+import time
+from contextlib import nullcontext
+
+
+class LearningMetrics:
+    """
+    Records what a learning loop spends its time on, as a stream of events.
+
+    Within a round, `phase(name)` times a block (phases can be nested, so the time of
+    a phase includes the phases inside it) and `count(name)` adds to a counter.
+    `end_round(**fields)` closes the round and sends a 'round' event, with the phase
+    times, the counters and the given fields, to every sink. A sink is any callable
+    that takes the event dict, e.g. a MetricsCollector or a JsonlMetricsSink.
+    """
+
+    enabled = True
+
+    def __init__(self, *sinks):
+        self.sinks = list(sinks)
+        self.round = 0
+        self._phases: dict[str, float] = {}
+        self._counts: dict[str, int] = {}
+        self._round_start = time.perf_counter()
+
+    def start(self, **fields):
+        """
+        Sends a 'start' event and restarts the clock of the current round.
+        """
+        self.emit('start', round=self.round, **fields)
+        self._round_start = time.perf_counter()
+
+    def phase(self, name: str) -> '_Phase':
+        return _Phase(self._phases, name)
+
+    def count(self, name: str, n: int = 1):
+        self._counts[name] = self._counts.get(name, 0) + n
+
+    def add_time(self, name: str, elapsed: float):
+        """
+        Adds time measured elsewhere (e.g. by the membership cache) to a phase.
+        """
+        self._phases[name] = self._phases.get(name, 0.0) + elapsed
+
+    def emit(self, event: str, **fields):
+        """
+        Sends an event to every sink.
+        """
+        record = {'event': event, 'timestamp': time.time(), **fields}
+        for sink in self.sinks:
+            sink(record)
+
+    def end_round(self, **fields):
+        """
+        Sends the event of the current round and starts the next one.
+        """
+        now = time.perf_counter()
+        self.emit('round', round=self.round, time=now - self._round_start,
+                  phases=self._phases, counts=self._counts, **fields)
+        self.round += 1
+        self._phases = {}
+        self._counts = {}
+        self._round_start = now
+
+
+class _Phase:
+    __slots__ = ('phases', 'name', 'start')
+
+    def __init__(self, phases: dict[str, float], name: str):
+        self.phases = phases
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.phases[self.name] = self.phases.get(self.name, 0.0) + time.perf_counter() - self.start
+        return False
+
+
+class _DisabledMetrics:
+    """
+    The metrics of a loop that is not instrumented: every call does nothing.
+    """
+
+    enabled = False
+    _phase = nullcontext()
+
+    def start(self, **fields):
+        pass
+
+    def phase(self, name: str):
+        return self._phase
+
+    def count(self, name: str, n: int = 1):
+        pass
+
+    def add_time(self, name: str, elapsed: float):
+        pass
+
+    def emit(self, event: str, **fields):
+        pass
+
+    def end_round(self, **fields):
+        pass
+
+
+NO_METRICS = _DisabledMetrics()
+
+
+class MetricsCollector:
+    """
+    A sink that keeps the events in memory.
+    """
+
+    def __init__(self):
+        self.events: list[dict] = []
+
+    def __call__(self, event: dict):
+        self.events.append(event)
+
+    @property
+    def rounds(self) -> list[dict]:
+        return [event for event in self.events if event['event'] == 'round']
+
+    def totals(self) -> dict:
+        """
+        Adds up the phase times and the counters of every round.
+        """
+        phases, counts = {}, {}
+        for event in self.rounds:
+            for name, elapsed in event['phases'].items():
+                phases[name] = phases.get(name, 0.0) + elapsed
+            for name, n in event['counts'].items():
+                counts[name] = counts.get(name, 0) + n
+        return {'rounds': len(self.rounds), 'phases': phases, 'counts': counts}
+
+
+class JsonlMetricsSink:
+    """
+    A sink that appends every event as a line of JSON. Lines are flushed as they are
+    written, so the file can be followed while the learner runs.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def __call__(self, event: dict):
+        self._file.write(json.dumps(event) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
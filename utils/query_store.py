@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import threading
+
+# SQLite limits the number of parameters of a statement, so lookups are chunked.
+_CHUNK_SIZE = 500
+
+
+class QueryStore:
+    """
+    Persistent store of membership answers, kept in a local SQLite database.
+
+    Answers are keyed by (namespace, sequence), where the namespace identifies the
+    language that answered them (e.g. the hash of a transformer checkpoint), so one
+    file can hold the answers of many oracles. The database runs in WAL mode, so
+    several learner processes can read it while another one writes.
+
+    The connection is opened lazily by each process (and thread), so a store can be
+    pickled and sent to worker processes.
+    """
+
+    def __init__(self, path: str, namespace: str, timeout: float = 30.0):
+        self.path = path
+        self.namespace = namespace
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+
+    def __getstate__(self):
+        return {'path': self.path, 'namespace': self.namespace, 'timeout': self.timeout}
+
+    def __setstate__(self, state: dict):
+        self.__init__(state['path'], state['namespace'], state['timeout'])
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS queries ("
+                "namespace TEXT NOT NULL, sequence TEXT NOT NULL, accepted INTEGER NOT NULL, "
+                "PRIMARY KEY (namespace, sequence)) WITHOUT ROWID"
+            )
+            connection.commit()
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, sequence: str) -> bool | None:
+        return self.get_many([sequence]).get(sequence)
+
+    def get_many(self, sequences: list[str]) -> dict[str, bool]:
+        """
+        Looks up many sequences at once. Returns the answers of the sequences found.
+        """
+        distinct = list(dict.fromkeys(sequences))
+        found = {}
+        for start in range(0, len(distinct), _CHUNK_SIZE):
+            chunk = distinct[start:start + _CHUNK_SIZE]
+            rows = self.connection.execute(
+                f"SELECT sequence, accepted FROM queries WHERE namespace = ? "
+                f"AND sequence IN ({', '.join('?' * len(chunk))})",
+                [self.namespace, *chunk]
+            )
+            found.update((sequence, bool(accepted)) for sequence, accepted in rows)
+        self.hits += len(found)
+        self.misses += len(distinct) - len(found)
+        return found
+
+    def put(self, sequence: str, accepted: bool):
+        self.put_many({sequence: accepted})
+
+    def put_many(self, answers: dict[str, bool]):
+        """
+        Stores many answers in a single transaction. Answers already stored are kept.
+        """
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO queries (namespace, sequence, accepted) VALUES (?, ?, ?)",
+                [(self.namespace, sequence, int(accepted)) for sequence, accepted in answers.items()]
+            )
+
+    def __len__(self):
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM queries WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def __str__(self):
+        return f"QueryStore(path={self.path}, namespace={self.namespace}, hits={self.hits}, misses={self.misses})"
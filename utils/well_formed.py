@@ -1,4 +1,4 @@
-from base.alphabet import VPAlphabet, RankedAlphabet
+from base.alphabet import VPAlphabet, RankedAlphabet, PUSH, POP
 from base.tree import Tree, TreeSymbol, empty_symbol, epsilon
 from tree_automata.tree_state import TreeAutomataState, TreeAutomataTransitionKey
 from tree_automata.tree_automata import TreeAutomata
@@ -63,21 +63,19 @@ def belongs_to_most_permissive_vpg(alphabet: VPAlphabet, sequence: str) -> bool:
     if not sequence:
         return True
 
-    # Check if the sequence contains only symbols from the alphabet
+    # Single pass: every symbol must be in the alphabet and every pop must close an open push.
+    # Only the depth of the stack matters, not its content.
+    kinds = alphabet.kinds
+    depth = 0
     for symbol in sequence:
-        if symbol not in alphabet.get_all_symbols():
-            return False
-
-    # Check if the sequence is well-formed according to the rules of VPG
-    stack = []
-    for symbol in sequence:
-        if symbol in alphabet.get_push_symbols():
-            stack.append(symbol)
-        elif symbol in alphabet.get_pop_symbols():
-            if not stack:
+        kind = kinds.get(symbol)
+        if kind == PUSH:
+            depth += 1
+        elif kind == POP:
+            if depth == 0:
                 return False
-            stack.pop()
-        elif symbol in alphabet.get_int_symbols():
-            continue
+            depth -= 1
+        elif kind is None:
+            return False
 
-    return len(stack) == 0
+    return depth == 0
@@ -1,18 +1,36 @@
 from vpl_extraction.vpl_star_oracle import VPLStarOracle
 from vpl_extraction.vpl_star_random_comparator import VPLRandomComparator
 from tree_automata_extraction.tl_star import TLStar
+from tree_automata_extraction.observation_table import ObservationTable
 from models.tree_automata_vpl import nta_2_vpg
 from base.vpl import VPL
+from utils.query_store import QueryStore
+from utils.metrics import LearningMetrics
 
 class VPLStar:
-    def __init__(self, oracle: VPL, comparator: VPLRandomComparator=None):
-        self.oracle = VPLStarOracle(oracle)
+    def __init__(self, oracle: VPL, comparator: VPLRandomComparator=None, query_store: QueryStore | str = None,
+                 checkpoint_path: str = None, metrics: LearningMetrics = None, cache_queries: bool = True,
+                 cache_size: int | None = None, cache_policy: str = 'lru',
+                 observation_table: ObservationTable = None):
+        self.oracle = VPLStarOracle(oracle, query_store)
         if comparator is None:
             comparator = VPLRandomComparator(oracle.alphabet)
         
         self.comparator = comparator
-        self.TLStar = TLStar(self.oracle, self.comparator)
+        self.TLStar = TLStar(self.oracle, self.comparator, cache_queries, cache_size, cache_policy,
+                             checkpoint_path=checkpoint_path, metrics=metrics, observation_table=observation_table)
+
+    @classmethod
+    def resume(cls, path: str, oracle: VPL, comparator: VPLRandomComparator = None,
+               query_store: QueryStore | str = None, cache_queries: bool = True, cache_size: int | None = None,
+               cache_policy: str = 'lru', metrics: LearningMetrics = None) -> 'VPLStar':
+        """
+        Builds a learner that continues from the observation table saved in path.
+        """
+        observation_table = ObservationTable.load(path, cache_queries, cache_size, cache_policy)
+        return cls(oracle, comparator, query_store, checkpoint_path=path, metrics=metrics,
+                   observation_table=observation_table)
 
     def learn(self):
-        learned_tree_automata = self.TLStar.learn()
+        learned_tree_automata = self.TLStar.learn().minimize()
         return nta_2_vpg(learned_tree_automata, self.oracle.get_alphabet())
\ No newline at end of file
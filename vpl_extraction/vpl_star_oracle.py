@@ -1,9 +1,31 @@
-from utils.encoding import tree_2_sequence, vpalphabet_2_ranked
-from utils.well_formed import tree_is_well_formed
+import weakref
+from utils.b_parse import get_t_b_parse
+from utils.encoding import get_codec, VPCodec
 from base.alphabet import VPAlphabet
 from base.tree import Tree
 from base.vpl import VPL
-from utils.b_parse import get_t_b_parse
+from utils.query_store import QueryStore
+
+# Estado de los árboles sin transición en T(B_parse) (None marca "sin memo").
+_REJECTED = object()
+
+# Transiciones de T(B_parse) por codec: los estados memoizados en los árboles son los de este autómata.
+_b_parse_tables: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def _b_parse_table(codec: VPCodec) -> tuple[dict, set]:
+    """
+    Returns the (symbol, child states) -> state table of T(B_parse) for the alphabet of
+    the codec and its final states, built once per codec.
+    """
+    table = _b_parse_tables.get(codec)
+    if table is None:
+        t_b_parse = get_t_b_parse(codec.alphabet)
+        transitions = {
+            (key.symbol, key.child_states): state for key, state in t_b_parse.transitions.items()
+        }
+        table = _b_parse_tables[codec] = (transitions, t_b_parse.final_states)
+    return table
 
 class VPLStarOracle:
     """
@@ -11,9 +33,19 @@ class VPLStarOracle:
     by the VPL and to generate random words from the VPL's alphabet.
     """
 
-    def __init__(self, vpl: VPL):
+    def __init__(self, vpl: VPL, query_store: QueryStore | str = None):
         self.vpl = vpl
-        self.t_b_parse = get_t_b_parse(vpl.get_alphabet())
+        self.codec = get_codec(vpl.get_alphabet())
+        self._b_parse_transitions, self._b_parse_final_states = _b_parse_table(self.codec)
+        # Persistent answers of the VPL, shared across runs. A path opens a store in the namespace of the VPL.
+        if query_store is not None:
+            try:
+                identity = vpl.identity()
+            except NotImplementedError as error:
+                raise ValueError(f"A query store needs a VPL with an identity: {error}") from error
+            if isinstance(query_store, str):
+                query_store = QueryStore(query_store, identity)
+        self.query_store = query_store
 
     @property
     def alphabet(self) -> VPAlphabet:
@@ -32,14 +64,70 @@ class VPLStarOracle:
         return self.vpl.get_alphabet()
 
 
+    def linearize(self, tree: Tree) -> str | None:
+        """
+        Returns the sequence of a tree, or None if the tree is not well-formed (not in T(B_parse)).
+
+        The B_parse check runs bottom-up and finds, for every subtree, the state T(B_parse)
+        reaches on it, looked up in the transitions of get_t_b_parse (or rejected when there
+        is none). Trees are interned, so that state is memoized
+        on every subtree (it only depends on the alphabet, so the owner of the memo is the
+        codec): the trees of the observation table are built from trees that were already
+        checked, and only their new nodes are walked. Only well-formed roots are linearized,
+        in a single walk.
+        """
+        codec = self.codec
+        transitions = self._b_parse_transitions
+        if tree.memo(codec) is None:
+            # Pre-order listing of the nodes not checked yet; reversed, children come first.
+            pending = [tree]
+            order = []
+            while pending:
+                node = pending.pop()
+                if node.memo(codec) is None:
+                    order.append(node)
+                    pending.extend(node.children)
+            for node in reversed(order):
+                if node.memo(codec) is None:
+                    child_states = tuple(child.memo(codec) for child in node.children)
+                    node.set_memo(codec, transitions.get((node.root, child_states), _REJECTED))
+
+        return codec.encode(tree) if tree.memo(codec) in self._b_parse_final_states else None
+
     def is_accepted(self, tree: Tree) -> bool:
         """
         Check if a sequence is accepted by the VPL.
         """
-        if not self.t_b_parse.is_accepted(tree):
+        sequence = self.linearize(tree)
+        if sequence is None:
             return False
-        sequence = tree_2_sequence(tree, self.get_alphabet())
+        if self.query_store is not None:
+            return self._ask_vpl([sequence])[0]
         return self.vpl.is_accepted(sequence)
+
+    def is_accepted_batch(self, trees: list[Tree]) -> list[bool]:
+        """
+        Check the membership of many trees at once.
+        The well-formed trees are linearized and sent to the VPL in a single batch.
+        """
+        sequences = [self.linearize(tree) for tree in trees]
+        answers = iter(self._ask_vpl([sequence for sequence in sequences if sequence is not None]))
+        return [bool(next(answers)) if sequence is not None else False for sequence in sequences]
+
+    def _ask_vpl(self, sequences: list[str]) -> list[bool]:
+        """
+        Asks the VPL in a single batch, only for the sequences missing from the query store.
+        """
+        if self.query_store is None:
+            return self.vpl.is_accepted_batch(sequences)
+
+        known = self.query_store.get_many(sequences)
+        missing = [sequence for sequence in dict.fromkeys(sequences) if sequence not in known]
+        if missing:
+            answers = {sequence: bool(answer) for sequence, answer in zip(missing, self.vpl.is_accepted_batch(missing))}
+            self.query_store.put_many(answers)
+            known.update(answers)
+        return [known[sequence] for sequence in sequences]
     
     
     def get_random_word(self) -> str:
@@ -10,11 +10,14 @@ class VPLRandomComparator(VPLStarComparator):
     A comparator for VPLs that uses a random sequence of symbols to compare two automata.
     """
     
-    def __init__(self, alphabet: VPAlphabet, random_trees: int = 100, max_depth: int = 6):
+    def __init__(self, alphabet: VPAlphabet, random_trees: int = 100, max_depth: int = 6,
+                 max_size: int = None, seed: int = None):
         self.random_trees = random_trees
         self.max_depth = max_depth
+        # If max_size is set, trees are sampled uniformly by size instead of by depth.
+        self.max_size = max_size
         self.vpa_alphabet = alphabet
-        self.generator = TreeGenerator(vpalphabet_2_ranked(alphabet))
+        self.generator = TreeGenerator(vpalphabet_2_ranked(alphabet), seed=seed)
 
 
     def get_counter_example(self, tree_automata: TreeAutomata, oracle: VPLStarOracle) -> str | None:
@@ -22,10 +25,15 @@ class VPLRandomComparator(VPLStarComparator):
         Get a counter example from the oracle by generating random words.
         """
 
-        trees = self.generator.generate_trees(self.random_trees, self.max_depth)
-        for tree in trees:
+        if self.max_size is None:
+            trees = self.generator.generate_trees(self.random_trees, self.max_depth)
+        else:
+            trees = list(self.generator.iter_trees_by_size(self.random_trees, 1, self.max_size))
+        hypothesis_results = tree_automata.accept_batch(trees)
+        oracle_results = oracle.is_accepted_batch(trees)
+        for tree, hypothesis_result, oracle_result in zip(trees, hypothesis_results, oracle_results):
             # If the tree is accepted by the oracle but not by the tree automata
-            if oracle.is_accepted(tree) != tree_automata.is_accepted(tree):
+            if oracle_result != hypothesis_result:
                 return tree
 
         # If no counter example was found